@@ -0,0 +1,275 @@
+from rollout import simulate_leaf, simulate_leaf_batch
+from minimax import prove
+import numpy as np
+import math
+import random
+
+
+COLUMNS = {
+    'parent': np.int32,
+    'first_child': np.int32,
+    'child_count': np.int32,
+    'move': np.int32,
+    'visits': np.int32,
+    'count': np.int32,
+    'sum': np.float64,
+    'sum_squares': np.float64,
+    'terminal': np.bool_,
+    'terminal_value': np.float64,
+    'side': np.int8,
+    'minimax_tested': np.bool_,
+}
+
+
+class ArrayTree:
+    # Column store for an MCTS tree. Children of a node are contiguous, moves are ids into move_table,
+    # and only the root state is kept: every other state is rebuilt by replaying moves from the root.
+
+    def __init__(self, game, capacity=4096):
+        self.game = game
+        self.capacity = capacity
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.size = 1
+        self.parent[0] = -1
+        self.side[0] = 1
+        self.names = {1: game.player_name(), -1: game.opposite_player()}
+        self.move_table = []
+        self.move_ids = {}
+
+    def root(self):
+        return ArrayNode(self, 0, self.game)
+
+    def allocate(self, n):
+        if self.size + n > self.capacity:
+            while self.size + n > self.capacity:
+                self.capacity *= 2
+            for name in COLUMNS:
+                column = getattr(self, name)
+                grown = np.zeros(self.capacity, dtype=column.dtype)
+                grown[:len(column)] = column
+                setattr(self, name, grown)
+        start = self.size
+        self.size += n
+        return start
+
+    def move_id(self, move):
+        key = move if isinstance(move, tuple) else int(move)
+        if key not in self.move_ids:
+            self.move_ids[key] = len(self.move_table)
+            self.move_table.append(move)
+        return self.move_ids[key]
+
+    def replay(self, index):
+        path = []
+        while index > 0:
+            path.append(self.move_table[self.move[index]])
+            index = self.parent[index]
+        game = self.game.copy()
+        for move in reversed(path):
+            game.play(move)
+        return game
+
+    def add_value(self, index, value):
+        self.count[index] += 1
+        self.sum[index] += value
+        self.sum_squares[index] += value * value
+
+    def weights(self, first, count, parent_visits, c):
+        end = first + count
+        visits = self.visits[first:end]
+        n = self.count[first:end]
+        total = self.sum[first:end]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ucb = np.log(parent_visits / visits)
+            avg = total / n
+            std = np.where(n > 1, np.sqrt(np.maximum(self.sum_squares[first:end] - total * avg, 0) / (n - 1)), 0)
+            weights = avg + c * np.sqrt(ucb * np.minimum(1/4, std + 2*ucb))
+        weights = np.where(self.terminal[first:end], self.terminal_value[first:end], weights)
+        return np.where(visits == 0, math.inf, weights)
+
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+
+class ArrayNode:
+    # Lightweight view of one ArrayTree row exposing the Node interface used by the search loops
+
+    __slots__ = ('tree', 'index', '_game')
+
+    def __init__(self, tree, index, game=None):
+        self.tree = tree
+        self.index = index
+        self._game = game
+
+    @property
+    def game(self):
+        if self._game is None:
+            self._game = self.tree.replay(self.index)
+        return self._game
+
+    @property
+    def visits(self):
+        return int(self.tree.visits[self.index])
+
+    @property
+    def move(self):
+        if self.index == 0:
+            return None
+        return self.tree.move_table[self.tree.move[self.index]]
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return None if parent < 0 else ArrayNode(self.tree, int(parent))
+
+    @property
+    def children(self):
+        first = int(self.tree.first_child[self.index])
+        return [ArrayNode(self.tree, first + k) for k in range(self.tree.child_count[self.index])]
+
+    @property
+    def is_terminal(self):
+        return bool(self.tree.terminal[self.index])
+
+    @property
+    def terminal_value(self):
+        return float(self.tree.terminal_value[self.index])
+
+    def child_weights(self, c):
+        tree, index = self.tree, self.index
+        return tree.weights(tree.first_child[index], tree.child_count[index], tree.visits[index], c)
+
+    def weight(self, c):
+        return float(self.tree.weights(self.index, 1, self.tree.visits[self.tree.parent[self.index]], c)[0])
+
+    def best_move(self, c):
+        child = int(np.argmax(self.child_weights(c)))
+        return ArrayNode(self.tree, int(self.tree.first_child[self.index]) + child).move
+
+    def subtree_size(self):
+        if self.index == 0:
+            return self.tree.size
+        return 1 + sum(child.subtree_size() for child in self.children)
+
+    def non_terminal_children(self):
+        tree = self.tree
+        first = int(tree.first_child[self.index])
+        terminal = tree.terminal[first:first + tree.child_count[self.index]]
+        return [ArrayNode(tree, first + k) for k in np.flatnonzero(~terminal).tolist()]
+
+    def is_leaf(self):
+        return len(self.non_terminal_children()) == 0
+
+    def select(self, c):
+        tree = self.tree
+        first = int(tree.first_child[self.index])
+        weights = self.child_weights(c)
+        weights[tree.terminal[first:first + len(weights)]] = -math.inf
+        return ArrayNode(tree, first + int(np.argmax(weights)))
+
+    def expand(self):
+        tree, index = self.tree, self.index
+        if tree.child_count[index] == 0:
+            moves = self.game.moves()
+            if len(moves) == 0:
+                return self
+            first = tree.allocate(len(moves))
+            end = first + len(moves)
+            tree.first_child[index] = first
+            tree.child_count[index] = len(moves)
+            tree.parent[first:end] = index
+            tree.side[first:end] = -tree.side[index]
+            tree.move[first:end] = [tree.move_id(move) for move in moves]
+
+        child = ArrayNode(tree, int(tree.first_child[index]) + random.randrange(tree.child_count[index]))
+        # The child takes over this view's state, except at the root whose state belongs to the caller
+        game = self.game.copy() if index == 0 else self.game
+        self._game = None
+        game.play(child.move)
+        child._game = game
+        return child
+
+    def declare_terminal(self, winner):
+        tree, index = self.tree, self.index
+        tree.terminal[index] = True
+        if winner != tree.names[tree.side[index]]:
+            tree.terminal_value[index] = math.inf
+        elif winner is not None:
+            tree.terminal_value[index] = -math.inf
+
+    def declare_draw(self):
+        self.tree.terminal[self.index] = True
+
+    def simulate(self, stats=None, solver=None, rollout=None):
+        return simulate_leaf(self, stats, solver, rollout)
+
+    def simulate_batch(self, playouts, stats=None, solver=None, rollout=None):
+        return simulate_leaf_batch(self, playouts, stats, solver, rollout)
+
+    def minimax(self, depth, table=None, stats=None, max_nodes=None, proofs=None):
+        tree, index = self.tree, self.index
+        if not tree.minimax_tested[index]:
+            tree.minimax_tested[index] = True
+            minimax_result = prove(self.game, depth, table, stats, max_nodes, proofs)
+            if minimax_result != 0:
+                winner = self.game.player_name() if minimax_result == math.inf else self.game.opposite_player()
+                self.declare_terminal(winner)
+                return winner
+
+    def children_terminal_values(self, index):
+        first = self.tree.first_child[index]
+        return self.tree.terminal_value[first:first + self.tree.child_count[index]]
+
+    def backpropagation(self, winner, stats=None):
+        tree, index = self.tree, self.index
+        while index >= 0:
+            tree.visits[index] += 1
+            values = self.children_terminal_values(index)
+            if winner != tree.names[tree.side[index]]:
+                if len(values) > 0 and np.all(values == -math.inf):
+                    stats and stats.proven(tree.terminal[index])
+                    tree.terminal_value[index] = math.inf
+                    tree.terminal[index] = True
+                else:
+                    tree.add_value(index, 1)
+            elif winner is not None:
+                if np.any(values == math.inf):
+                    stats and stats.proven(tree.terminal[index])
+                    tree.terminal_value[index] = -math.inf
+                    tree.terminal[index] = True
+                else:
+                    tree.add_value(index, -1)
+            else:
+                tree.add_value(index, 0)
+            index = tree.parent[index]
+
+    def backpropagation_with_minimax(self, winner, depth, is_previous_terminal=None, table=None, stats=None,
+                                     max_nodes=None, proofs=None):
+        tree, index = self.tree, self.index
+        while index >= 0:
+            tree.visits[index] += 1
+            values = self.children_terminal_values(index)
+            if winner != tree.names[tree.side[index]]:
+                if np.any(values == -math.inf):
+                    if np.all(values == -math.inf):
+                        stats and stats.proven(tree.terminal[index])
+                        tree.terminal_value[index] = math.inf
+                        tree.terminal[index] = True
+                    else:
+                        if is_previous_terminal:
+                            ArrayNode(tree, int(index)).minimax(depth, table, stats, max_nodes, proofs)
+                        tree.add_value(index, 1)
+                else:
+                    tree.add_value(index, 1)
+            elif winner is not None:
+                if np.any(values == math.inf):
+                    stats and stats.proven(tree.terminal[index])
+                    tree.terminal_value[index] = -math.inf
+                    tree.terminal[index] = True
+                else:
+                    tree.add_value(index, -1)
+            else:
+                tree.add_value(index, 0)
+            is_previous_terminal = bool(tree.terminal[index])
+            index = tree.parent[index]
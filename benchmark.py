@@ -0,0 +1,743 @@
+from othello import Othello, BitboardOthello, square, transform
+from utils import perft, simulate_series, Player
+from parallel import root_parallel, leaf_parallel
+from minimax import minimax, iterative_deepening, position_key, MoveOrdering, TranspositionTable, ProofCache
+from catchTheLion import CatchTheLion, EncodedCatchTheLion
+from connect4 import Connect4
+from contextlib import contextmanager
+from mcts import Node, mcts, mcts_mr, new_root, SEARCHES, SearchStats, PHASES
+from arraytree import COLUMNS
+from rollout import batch_playouts, rollout_policy, ROLLOUTS
+from tournament import Experiment, run_tournament, savings, play_game, search_seconds, EXPECTED_PLIES
+from solver import Solver
+from book import build_book
+import tracemalloc
+import tempfile
+import os
+import argparse
+import resource
+import platform
+import random
+import json
+import gc
+import sys
+import time
+
+
+def playouts_per_second(game_creator, duration=2):
+    start = time.time()
+    playouts = 0
+    while time.time() - start < duration:
+        game = game_creator()
+        while len(moves := game.moves()) > 0:
+            game.play(random.choice(moves))
+        game.winner()
+        playouts += 1
+    return playouts / (time.time() - start)
+
+
+def midgame(game_creator, plies, seed):
+    rng = random.Random(seed)
+    game = game_creator()
+    for _ in range(plies):
+        if len(moves := game.moves()) == 0:
+            break
+        game.play(moves[rng.randrange(len(moves))])
+    return game
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def bench_memory(number_of_games=100, report_every=10):
+    players = Player('mcts', duration=0.01), Player('random')
+    for played in range(0, number_of_games, report_every):
+        simulate_series(Connect4, report_every, *players)
+        gc.collect()
+        print(f'after {played + report_every} games: RSS {rss_mb():.1f} MB')
+
+
+def bench_parallel(duration=2, worker_counts=(1, 2, 4, 8, 16)):
+    for workers in worker_counts:
+        root_parallel('mcts', BitboardOthello(), workers, duration=0.1)  # warm up the pool
+        start = time.time()
+        root = root_parallel('mcts', BitboardOthello(), workers, duration=duration)
+        root_rate = root.visits / (time.time() - start)
+        start = time.time()
+        root = leaf_parallel(BitboardOthello(), workers, duration=duration)
+        leaf_rate = root.visits / (time.time() - start)
+        print(f'{workers:2d} workers: root {root_rate:9.1f} playouts/sec, leaf {leaf_rate:9.1f} playouts/sec')
+
+
+def bench_tree_reuse(games=3, duration=0.2):
+    for reuse_tree in [False, True]:
+        visits = []
+        for _ in range(games):
+            game = BitboardOthello()
+            player = Player('mcts', duration=duration, reuse_tree=reuse_tree)
+            opponent = Player('mcts', duration=duration, reuse_tree=False)
+            while len(game.moves()) > 0:
+                game.play(player.model(game))
+                visits.append(player.root.visits)
+                if len(game.moves()) > 0:
+                    game.play(opponent.model(game))
+        print(f'reuse_tree={reuse_tree}: {sum(visits) / len(visits):.1f} root visits per decision')
+
+
+def check_zobrist(games=50):
+    for game_creator in [Othello, BitboardOthello, Connect4, CatchTheLion, EncodedCatchTheLion]:
+        for _ in range(games):
+            game = game_creator()
+            while len(moves := game.moves()) > 0:
+                game.play(random.choice(moves))
+                assert game.zobrist == game.compute_zobrist(), f'{game_creator.__name__} hash drifted\n{game}'
+        print(f'{game_creator.__name__}: incremental Zobrist hash matches over {games} games')
+
+
+def bench_transposition_table(depths=range(2, 7), positions=5):
+    check_zobrist()
+    for game_creator, plies in [(BitboardOthello, 20), (Connect4, 10), (CatchTheLion, 10)]:
+        games = [midgame(game_creator, plies, seed) for seed in range(positions)]
+        for depth in depths:
+            row = f'{game_creator.__name__:16s} depth {depth}:'
+            for table in [False, True]:
+                stats = dict()
+                start = time.time()
+                for game in games:
+                    minimax(game, depth, TranspositionTable() if table else None, stats)
+                row += f' {"tt" if table else "plain"} {stats["nodes"]:8d} nodes {time.time() - start:7.3f}s'
+            print(row)
+
+
+def bench_move_ordering(depths=range(2, 7), positions=5):
+    # Nodes at equal depth: generator order, killer/history/capture ordering, both with a transposition table,
+    # and the total over every iteration of a deepening search to the same depth
+    for game_creator, plies in [(BitboardOthello, 20), (Connect4, 10), (CatchTheLion, 4)]:
+        games = [game for game in (midgame(game_creator, plies, seed) for seed in range(positions))
+                 if len(game.moves()) > 0]
+        for depth in depths:
+            row = f'{game_creator.__name__:16s} depth {depth}:'
+            for name, table, ordering in [('plain', False, False), ('ordered', False, True),
+                                          ('tt', True, False), ('tt+ordered', True, True)]:
+                stats = dict()
+                for game in games:
+                    minimax(game, depth, TranspositionTable() if table else None, stats,
+                            MoveOrdering() if ordering else None)
+                row += f' {name} {stats["nodes"]:8d}'
+            stats = dict()
+            for game in games:
+                iterative_deepening(game, depth, stats=stats)
+            print(f'{row} deepening {stats["nodes"]:8d}')
+
+
+def bench_proof_cache(depths=range(1, 5), plies=12, iterations=200, seed=0):
+    # mcts-mr playing both sides of one game, with and without a proof cache kept across the turns.
+    # The cache returns what minimax would have, so both runs build the same trees and play the same moves.
+    for game_creator in [BitboardOthello, CatchTheLion]:
+        for depth in depths:
+            row = f'{game_creator.__name__:16s} depth {depth}:'
+            for proofs in [None, ProofCache()]:
+                random.seed(seed)
+                game = game_creator()
+                stats = SearchStats()
+                start = time.perf_counter()
+                for _ in range(plies):
+                    if len(game.moves()) == 0:
+                        break
+                    game.play(mcts_mr(game, depth, c=0.7, iterations=iterations, stats=stats, proofs=proofs))
+                seconds = time.perf_counter() - start
+                row += f' {"cache" if proofs else "plain"} {seconds:6.2f}s minimax {stats.times["minimax"]:6.2f}s'
+                if proofs is not None:
+                    row += f' hits {proofs.hits / max(proofs.probes, 1):6.1%}'
+            print(row)
+
+
+@contextmanager
+def count_copies(game_class):
+    copies = [0]
+    original = game_class.copy
+
+    def counting_copy(self):
+        copies[0] += 1
+        return original(self)
+
+    game_class.copy = counting_copy
+    try:
+        yield copies
+    finally:
+        game_class.copy = original
+
+
+def check_undo(games=30):
+    for game_creator in [Othello, BitboardOthello, Connect4, CatchTheLion, EncodedCatchTheLion]:
+        for _ in range(games):
+            game = game_creator()
+            history = []
+            while len(moves := game.moves()) > 0:
+                history.append((game.key(), game.zobrist, list(moves)))
+                history[-1] += (game.play(random.choice(moves)),)
+            for key, h, moves, token in reversed(history):
+                game.undo(token)
+                assert (game.key(), game.zobrist, list(game.moves())) == (key, h, moves), \
+                    f'{game_creator.__name__} undo mismatch\n{game}'
+        print(f'{game_creator.__name__}: play/undo restores the position over {games} games')
+
+
+def bench_make_unmake(duration=2, depth=4, positions=5):
+    check_undo()
+    for game_creator, plies in [(Othello, 20), (BitboardOthello, 20), (Connect4, 10), (CatchTheLion, 10)]:
+        games = [midgame(game_creator, plies, seed) for seed in range(positions)]
+        start = time.time()
+        stats = dict()
+        while time.time() - start < duration:
+            for game in games:
+                minimax(game, depth, stats=stats)
+        minimax_rate = stats['nodes'] / (time.time() - start)
+        start = time.time()
+        playouts = 0
+        while time.time() - start < duration:
+            for game in games:
+                Node(game).simulate()
+                playouts += 1
+        playout_rate = playouts / (time.time() - start)
+
+        tracemalloc.start()
+        with count_copies(game_creator) as copies:
+            for game in games:
+                minimax(game, depth)
+                Node(game).simulate()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{game_creator.__name__:16s} minimax {minimax_rate:9.1f} nodes/sec, '
+              f'rollouts {playout_rate:8.1f} playouts/sec, {copies[0]:6d} copies, '
+              f'peak traced {peak / 2**10:6.1f} KiB')
+
+
+def tree_size(root):
+    if isinstance(root, Node):
+        return root.subtree_size()
+    return root.tree.size
+
+
+def bench_expansion(iterations=2000, positions=5):
+    # State copies made per iteration: expansion builds only the child it plays out
+    for game_creator, plies in [(Othello, 20), (BitboardOthello, 20), (CatchTheLion, 12), (EncodedCatchTheLion, 12)]:
+        games = [game for game in (midgame(game_creator, plies, seed) for seed in range(positions))
+                 if len(game.moves()) > 0]
+        random.seed(0)
+        with count_copies(game_creator) as copies:
+            start = time.perf_counter()
+            for game in games:
+                mcts(game, c=0.7, iterations=iterations)
+            seconds = time.perf_counter() - start
+        total = iterations * len(games)
+        print(f'{game_creator.__name__:20s} {copies[0] / total:6.2f} copies/iteration '
+              f'{total / seconds:8.1f} iterations/sec')
+
+
+def bench_array_tree(duration=5):
+    for game_creator in [BitboardOthello, Connect4, CatchTheLion]:
+        for tree in ['node', 'array']:
+            root = new_root(game_creator(), tree)
+            start = time.time()
+            mcts(game_creator(), duration, root=root)
+            rate = root.visits / (time.time() - start)
+
+            tracemalloc.start()
+            root = new_root(game_creator(), tree)
+            mcts(game_creator(), duration, root=root)
+            memory = tracemalloc.get_traced_memory()[0]
+            nodes = tree_size(root)
+            del root
+            tracemalloc.stop()
+            print(f'{game_creator.__name__:16s} {tree:5s}: {rate:8.1f} iterations/sec, '
+                  f'{nodes} nodes in {memory / 2**20:.1f} MiB = {nodes / (memory / 2**30):12.0f} nodes/GB')
+        row_bytes = sum(dtype().itemsize for dtype in COLUMNS.values())
+        print(f'{game_creator.__name__:16s} array columns: {row_bytes} bytes/node = {2**30 // row_bytes} nodes/GB')
+
+
+def bench_search_curve(duration=5, windows=10):
+    for game_creator in [BitboardOthello, CatchTheLion]:
+        for tree in ['node', 'array']:
+            root = new_root(game_creator(), tree)
+            rates = []
+            for _ in range(windows):
+                visits = root.visits
+                mcts(game_creator(), duration / windows, root=root)
+                rates.append((root.visits - visits) / (duration / windows))
+            print(f'{game_creator.__name__:16s} {tree:5s} iterations/sec per {duration / windows:.1f}s window: '
+                  + ' '.join(f'{rate:6.0f}' for rate in rates))
+
+
+def bench_batch_playouts(duration=2, batch_sizes=(1, 4, 16, 64, 256, 1024)):
+    for game_creator, plies in [(BitboardOthello, 20), (Connect4, 8)]:
+        game = midgame(game_creator, plies, 0)
+        row = f'{game_creator.__name__:16s} playouts/sec by K:'
+        for k in batch_sizes:
+            start = time.time()
+            playouts = 0
+            while time.time() - start < duration:
+                if k > 1:
+                    playouts += len(batch_playouts(game, k))
+                else:
+                    Node(game).simulate()
+                    playouts += 1
+            row += f' {k}: {playouts / (time.time() - start):.0f}'
+        print(row)
+
+
+def check_connect4_winner(games=500):
+    for _ in range(games):
+        game = Connect4()
+        while len(moves := game.moves()) > 0:
+            game.play(random.choice(moves))
+            assert game.winner() == game.board_winner(), f'incremental and convolution winner differ\n{game}'
+        assert game.copy().winner() == game.board_winner()
+    print(f'Connect4: incremental winner matches the convolution check over {games} games')
+
+
+def bench_connect4():
+    check_connect4_winner()
+    print(f'Connect4 playouts/sec: {playouts_per_second(Connect4, 3):.1f}')
+
+
+def check_encoded_catch_the_lion(depth=5, games=300):
+    for d in range(1, depth + 1):
+        expected, actual = perft(CatchTheLion(), d), perft(EncodedCatchTheLion(), d)
+        assert expected == actual, f'perft({d}): CatchTheLion {expected} != EncodedCatchTheLion {actual}'
+        print(f'perft({d}) = {actual}')
+
+    for _ in range(games):
+        game, encoded = CatchTheLion(), EncodedCatchTheLion()
+        while len(moves := game.moves()) > 0:
+            assert sorted(map(str, moves)) == sorted(map(str, encoded.moves())), f'move mismatch\n{game}'
+            assert game.zobrist == encoded.zobrist and game.winner() == encoded.winner()
+            move = random.choice(moves)
+            game.play(move)
+            encoded.play(move)
+        assert encoded.moves() == [] and game.winner() == encoded.winner()
+        assert EncodedCatchTheLion.from_catch_the_lion(game).key() == encoded.key()
+    print(f'{games} random games agree')
+
+
+def bench_catch_the_lion(duration=3, depth=4, positions=5):
+    check_encoded_catch_the_lion()
+    for game_creator in [CatchTheLion, EncodedCatchTheLion]:
+        games = [midgame(game_creator, 10, seed) for seed in range(positions)]
+        start = time.time()
+        stats = dict()
+        while time.time() - start < duration:
+            for game in games:
+                minimax(game, depth, stats=stats)
+        minimax_rate = stats['nodes'] / (time.time() - start)
+        print(f'{game_creator.__name__:20s} rollouts {playouts_per_second(game_creator, duration):8.1f} playouts/sec, '
+              f'minimax {minimax_rate:9.1f} nodes/sec')
+
+
+def check_othello_bitboard(depth=5, games=200):
+    for d in range(1, depth + 1):
+        expected, actual = perft(Othello(), d), perft(BitboardOthello(), d)
+        assert expected == actual, f'perft({d}): Othello {expected} != BitboardOthello {actual}'
+        print(f'perft({d}) = {actual}')
+
+    for _ in range(games):
+        game, bitboard = Othello(), BitboardOthello()
+        while len(moves := game.moves()) > 0:
+            assert [square(r, c) for r, c in moves] == bitboard.moves(), f'move mismatch\n{game}'
+            row, col = random.choice(moves)
+            game.play((row, col))
+            bitboard.play(square(row, col))
+        assert bitboard.moves() == [] and game.winner() == bitboard.winner()
+    print(f'{games} random games agree')
+
+
+SUITE_GAMES = {
+    'Othello': (Othello, 20),
+    'BitboardOthello': (BitboardOthello, 20),
+    'Connect4': (Connect4, 8),
+    'CatchTheLion': (CatchTheLion, 4),
+    'EncodedCatchTheLion': (EncodedCatchTheLion, 4),
+}
+SUITE_PARAMETERS = {
+    'mcts': dict(c=0.7),
+    'mcts-mr': dict(c=0.7, depth=1),
+    'mcts-ms': dict(c=0.7, depth=2, visits=50),
+    'mcts-mb': dict(c=0.7, depth=2),
+    'minimax': dict(depth=4),
+}
+
+
+def suite_positions(game_creator, plies, positions, seed):
+    games = [midgame(game_creator, plies, seed + i) for i in range(positions)]
+    return [game for game in games if len(game.moves()) > 0]
+
+
+def run_algorithm(algorithm, games, iterations, seed, stats=None):
+    random.seed(seed)
+    parameters = SUITE_PARAMETERS[algorithm]
+    for game in games:
+        if algorithm == 'minimax':
+            minimax(game, parameters['depth'], stats=stats)
+        else:
+            SEARCHES[algorithm](game, iterations=iterations, stats=stats, **parameters)
+
+
+def suite(iterations=200, positions=3, seed=0, games=None, algorithms=None):
+    results = []
+    for game_name in games or SUITE_GAMES:
+        game_creator, plies = SUITE_GAMES[game_name]
+        for algorithm in algorithms or SUITE_PARAMETERS:
+            position_games = suite_positions(game_creator, plies, positions, seed)
+            # The timed run is uninstrumented, a second identical run collects the search statistics
+            start = time.perf_counter()
+            run_algorithm(algorithm, position_games, iterations, seed)
+            seconds = time.perf_counter() - start
+
+            stats = dict() if algorithm == 'minimax' else SearchStats()
+            run_algorithm(algorithm, position_games, iterations, seed, stats)
+
+            tracemalloc.start()
+            run_algorithm(algorithm, position_games, iterations, seed)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            result = dict(game=game_name, algorithm=algorithm, parameters=SUITE_PARAMETERS[algorithm],
+                          positions=len(position_games), seconds=seconds, peak_memory_bytes=peak)
+            if algorithm == 'minimax':
+                result.update(minimax_nodes=stats['nodes'], minimax_nodes_per_sec=stats['nodes'] / seconds)
+            else:
+                total = sum(stats.times.values()) or 1
+                result.update(
+                    iterations=stats.iterations,
+                    iterations_per_sec=stats.iterations / seconds,
+                    playouts=stats.playouts,
+                    playouts_per_sec=stats.playouts / seconds,
+                    minimax_calls=stats.minimax_calls,
+                    minimax_proven=stats.minimax_proven,
+                    backpropagation_proven=stats.backpropagation_proven,
+                    max_depth=stats.max_depth,
+                    mean_tree_size=stats.tree_size / stats.searches,
+                    phase_share={phase: stats.times[phase] / total for phase in PHASES},
+                )
+            results.append(result)
+            print(f'{game_name} {algorithm}: {seconds:.2f}s', file=sys.stderr)
+
+    return dict(
+        config=dict(iterations=iterations, positions=positions, seed=seed, python=platform.python_version(),
+                    machine=platform.machine()),
+        results=results,
+    )
+
+
+def bench_suite(iterations=200, positions=3, seed=0, games=None, algorithms=None, out=None):
+    report = json.dumps(suite(iterations, positions, seed, games, algorithms), indent=2)
+    if out is None:
+        print(report)
+    else:
+        with open(out, 'w') as f:
+            f.write(report + '\n')
+
+
+def bench_sequential(games=40, iterations=50):
+    # Fixed-length series on a reduced copy of the main.py grids, then where sprt() would have stopped each one
+    opponents = {
+        BitboardOthello: [('mcts-mr', dict(depth=1)), ('mcts-ms', dict(depth=2, visits=50)), ('mcts-mb', dict(depth=2))],
+        CatchTheLion: [('mcts-mr', dict(depth=1)), ('mcts-ms', dict(depth=4, visits=2)), ('mcts-mb', dict(depth=4))],
+    }
+    experiments = [Experiment(f'{game.__name__} - mcts vs {name} {parameters}', game,
+                              Player('mcts', iterations=iterations, c=0.7),
+                              Player(name, iterations=iterations, c=0.7, **parameters), games)
+                   for game, configurations in opponents.items() for name, parameters in configurations]
+    with tempfile.TemporaryDirectory() as directory:
+        path = f'{directory}/results.jsonl'
+        run_tournament(experiments, path)
+        report = savings(path)
+    for name, result in report.items():
+        outcome = {1: 'mcts stronger', -1: 'mcts weaker', 0: 'undecided'}[result['decision']]
+        print(f'{name}: {outcome} after {result["needed"]} of {result["played"]} games')
+    saved = sum(result['saved'] for result in report.values())
+    print(f'saved {saved} of {games * len(experiments)} games')
+
+
+def check_dag_catch_the_lion(positions=6, plies=4, iterations=20000, seed=0):
+    # CatchTheLion repeats positions along one path, every child of a node can then be an ancestor
+    for k in range(positions):
+        random.seed(seed + k)
+        game = midgame(EncodedCatchTheLion, plies, seed + k)
+        if len(game.moves()) > 0:
+            move = mcts(game, c=0.7, iterations=iterations, tree='dag')
+            assert move in game.moves(), k
+    print('dag searches CatchTheLion without cycles')
+
+
+def bench_dag(iterations=3000, games=20, duration=0.05, seed=0):
+    # Nodes and peak memory at equal iterations, then tree against DAG at equal time per move
+    check_dag_catch_the_lion()
+    for game_creator in [Connect4, CatchTheLion, BitboardOthello]:
+        row = f'{game_creator.__name__:16s}'
+        for tree in ['node', 'dag']:
+            random.seed(seed)
+            stats = SearchStats()
+            tracemalloc.start()
+            mcts(game_creator(), c=0.7, iterations=iterations, tree=tree, stats=stats)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            row += f' {tree} {stats.tree_size:6d} nodes {peak / 2**20:6.1f} MB'
+        print(row)
+
+    for game_creator in [Connect4, CatchTheLion]:
+        experiment = Experiment('dag', game_creator, Player('mcts', duration=duration, c=0.7, tree='dag'),
+                                Player('mcts', duration=duration, c=0.7), games)
+        results = [play_game(experiment, index, seed + index)['result'] for index in range(games)]
+        print(f'{game_creator.__name__}: dag {results.count(1)} wins, tree {results.count(-1)} wins, '
+              f'{results.count(0)} draws at {duration}s per move')
+
+
+def endgame(game_creator, empties, seed):
+    # Random play from the start position until empties() squares are left, restarting on early game ends
+    rng = random.Random(seed)
+    while True:
+        game = game_creator()
+        while game.empties() > empties and len(game.moves()) > 0:
+            game.play(rng.choice(game.moves()))
+        if game.empties() == empties and len(game.moves()) > 0:
+            return game
+
+
+def check_solver(positions=10, seed=0):
+    # Solver values against full-depth minimax, and the returned move reaching that value
+    for game_creator, empties in [(BitboardOthello, 8), (Othello, 6), (Connect4, 14)]:
+        for k in range(positions):
+            game = endgame(game_creator, empties, seed + k)
+            value, move = Solver(empties).solve(game)
+            expected = minimax(game.copy(), 64)
+            assert value == (0 if expected == 0 else 1 if expected > 0 else -1), (game_creator.__name__, k)
+            after = game.copy()
+            after.play(move)
+            assert -Solver(empties).solve(after)[0] == value, (game_creator.__name__, k)
+    print('solver matches minimax')
+
+
+def bench_solver(positions=5, seed=0, games=20, duration=0.2, empties=10):
+    check_solver()
+    for game_creator, counts in [(BitboardOthello, (6, 8, 10, 12, 14)), (Connect4, (10, 14, 18, 22))]:
+        for count in counts:
+            solver = Solver(count)
+            start = time.perf_counter()
+            for k in range(positions):
+                solver.solve(endgame(game_creator, count, seed + k))
+            seconds = (time.perf_counter() - start) / positions
+            print(f'{game_creator.__name__:16s} {count:2d} empties: {seconds * 1000:8.1f} ms '
+                  f'{solver.nodes // positions:8d} nodes per solve')
+
+    # mcts with the solver below `empties` against plain mcts, both at equal time per move
+    for game_creator in [BitboardOthello, Connect4]:
+        experiment = Experiment('solver', game_creator,
+                                Player('mcts', duration=duration, c=0.7, solver_empties=empties),
+                                Player('mcts', duration=duration, c=0.7), games)
+        results = [play_game(experiment, index, seed + index)['result'] for index in range(games)]
+        print(f'{game_creator.__name__}: solver {results.count(1)} wins, plain {results.count(-1)} wins, '
+              f'{results.count(0)} draws at {duration}s per move')
+
+
+def bench_rollout(duration=2, games=20, move_duration=0.2, seed=0):
+    # Playouts per second of each policy from the start position, then each policy against uniform playouts
+    # at equal time per move
+    game_creators = [BitboardOthello, Othello, CatchTheLion, Connect4]
+    for game_creator in game_creators:
+        row = f'{game_creator.__name__:16s}'
+        for name in ROLLOUTS:
+            policy = rollout_policy(name)
+            node = Node(game_creator())
+            start = time.time()
+            playouts = 0
+            while time.time() - start < duration:
+                node.simulate(rollout=policy)
+                playouts += 1
+            row += f' {name} {playouts / (time.time() - start):7.1f}/s'
+        print(row)
+
+    for game_creator in game_creators[1:]:
+        for name in list(ROLLOUTS)[1:]:
+            experiment = Experiment('rollout', game_creator,
+                                    Player('mcts', duration=move_duration, c=0.7, rollout=name),
+                                    Player('mcts', duration=move_duration, c=0.7), games)
+            results = [play_game(experiment, index, seed + index)['result'] for index in range(games)]
+            print(f'{game_creator.__name__}: {name} {results.count(1)} wins, random {results.count(-1)} wins, '
+                  f'{results.count(0)} draws at {move_duration}s per move')
+
+
+def position_counts(game_creator, plies, symmetric):
+    # Distinct positions at each ply of the full game tree, merged by position_key()
+    frontier = {position_key(game_creator(), symmetric)[0]: game_creator()}
+    counts = []
+    for _ in range(plies):
+        children = {}
+        for game in frontier.values():
+            for move in game.moves():
+                child = game.copy()
+                child.play(move)
+                children.setdefault(position_key(child, symmetric)[0], child)
+        frontier = children
+        counts.append(len(frontier))
+    return counts
+
+
+def sampled_positions(game_creator, plies, games, seed, symmetric):
+    # Distinct positions met in the first plies of random games
+    rng = random.Random(seed)
+    keys = set()
+    for _ in range(games):
+        game = game_creator()
+        for _ in range(plies):
+            if len(game.moves()) == 0:
+                break
+            game.play(rng.choice(game.moves()))
+            keys.add(position_key(game, symmetric)[0])
+    return len(keys)
+
+
+def check_canonical(games=200, seed=0):
+    # Every orientation of a position has one canonical key, the Zobrist hash of its canonical orientation
+    for k in range(games):
+        game = midgame(BitboardOthello, k % 40, seed + k)
+        key, symmetry = game.canonical()
+        for other in range(8):
+            assert BitboardOthello(game.player, transform(game.black, other), transform(game.white, other)) \
+                .canonical()[0] == key, f'BitboardOthello orientation {other} changes the key\n{game}'
+        assert BitboardOthello(game.player, transform(game.black, symmetry), transform(game.white, symmetry)) \
+            .zobrist == key, f'BitboardOthello canonical key is not the canonical Zobrist hash\n{game}'
+        game = midgame(Connect4, k % 30, seed + k)
+        mirrored = Connect4(game.player, game.board[::-1].copy())
+        key, symmetry = game.canonical()
+        assert mirrored.canonical()[0] == key, f'Connect4 mirror changes the key\n{game}'
+        assert key == (mirrored if symmetry else game).zobrist, f'Connect4 canonical key is not a Zobrist hash\n{game}'
+    print(f'canonical keys agree over every orientation of {games} positions per game')
+
+
+def bench_symmetry(plies=10, games=2000, exhaustive=6, depths=(6, 8), positions=5, seed=0):
+    # Positions with and without symmetric merging, then iterative deepening from opening positions
+    # with a plain and a symmetric transposition table
+    check_canonical()
+    for game_creator, depth in zip([BitboardOthello, Connect4], depths):
+        name = game_creator.__name__
+        plain, merged = (position_counts(game_creator, exhaustive, symmetric) for symmetric in (False, True))
+        print(f'{name} positions per ply: {plain} -> {merged}')
+        plain, merged = (sampled_positions(game_creator, plies, games, seed, symmetric) for symmetric in (False, True))
+        print(f'{name} first {plies} plies of {games} random games: {plain} -> {merged} positions '
+              f'({1 - merged / plain:.0%} fewer)')
+
+        for opening in (0, 1, 4):
+            row = f'{name} depth {depth} after {opening} plies:'
+            for symmetric in (False, True):
+                stats = {}
+                start = time.perf_counter()
+                for k in range(positions):
+                    iterative_deepening(midgame(game_creator, opening, seed + k), max_depth=depth, stats=stats,
+                                        symmetric=symmetric)
+                seconds = (time.perf_counter() - start) / positions
+                row += f' {"symmetric" if symmetric else "plain"} {seconds * 1000:6.1f} ms ' \
+                       f'{stats["nodes"] // positions:6d} nodes'
+            print(row)
+
+
+def bench_book(games=10, duration=0.2, book_duration=1, seed=0):
+    # Builds a small book per game, then the wall time of the same games with and without it on both sides,
+    # and a booked player against the same player without the book
+    with tempfile.TemporaryDirectory() as directory:
+        for game_creator, plies in [(BitboardOthello, 4), (Connect4, 3), (CatchTheLion, 3)]:
+            name = game_creator.__name__
+            path = f'{directory}/{name}.npy'
+            start = time.time()
+            entries = build_book(game_creator, path, plies, 'mcts', duration=book_duration, c=0.7)
+            print(f'{name}: {entries} positions, {os.path.getsize(path)} bytes, built in {time.time() - start:.1f}s')
+
+            # Game lengths differ once the book fixes the first moves, so the share of book moves is given too
+            seconds, moves = {}, {}
+            for book in (None, path):
+                experiment = Experiment('book', game_creator, Player('mcts', duration=duration, c=0.7, book=book),
+                                        Player('mcts', duration=duration, c=0.7, book=book), games)
+                records = [play_game(experiment, index, seed + index) for index in range(games)]
+                seconds[book] = sum(record['seconds'] for record in records) / games
+                moves[book] = sum(len(record['moves']) for record in records) / games
+            hits = sum(player.book.hits for player in (experiment.player1, experiment.player2)) / games
+            print(f'{name}: {seconds[None]:.2f}s for {moves[None]:.1f} moves per game without the book, '
+                  f'{seconds[path]:.2f}s for {moves[path]:.1f} moves with it, {hits:.1f} book moves per game '
+                  f'({hits / moves[path]:.0%} of the search time)')
+
+            experiment = Experiment('book', game_creator, Player('mcts', duration=duration, c=0.7, book=path),
+                                    Player('mcts', duration=duration, c=0.7), games)
+            results = [play_game(experiment, index, seed + index)['result'] for index in range(games)]
+            print(f'{name}: book {results.count(1)} wins, no book {results.count(-1)} wins, '
+                  f'{results.count(0)} draws at {duration}s per move')
+
+
+def bench_clock(games=10, duration=0.2, budgets=(1, 0.5), seed=0):
+    # A game clock player against a fixed duration player, the clock set to a fraction of what the fixed
+    # player is expected to spend on a game
+    for game_creator in [BitboardOthello, Connect4, CatchTheLion]:
+        name = game_creator.__name__
+        total = duration * EXPECTED_PLIES.get(name, 60) / 2
+        for budget in budgets:
+            experiment = Experiment('clock', game_creator, Player('mcts', clock=total * budget, c=0.7),
+                                    Player('mcts', duration=duration, c=0.7), games)
+            records = [play_game(experiment, index, seed + index) for index in range(games)]
+            clock, fixed = (sum(seconds) / games for seconds in zip(*map(search_seconds, records)))
+            results = [record['result'] for record in records]
+            print(f'{name} clock {total * budget:.1f}s: {clock:.2f}s per game against {fixed:.2f}s at '
+                  f'{duration}s per move ({1 - clock / fixed:.0%} saved), clock {results.count(1)} wins, '
+                  f'fixed {results.count(-1)} wins, {results.count(0)} draws')
+
+
+def bench_othello_bitboard():
+    check_othello_bitboard()
+    print(f'Othello playouts/sec: {playouts_per_second(Othello):.1f}')
+    print(f'BitboardOthello playouts/sec: {playouts_per_second(BitboardOthello):.1f}')
+
+
+BENCHMARKS = {
+    'othello-bitboard': bench_othello_bitboard,
+    'memory': bench_memory,
+    'parallel': bench_parallel,
+    'tree-reuse': bench_tree_reuse,
+    'transposition-table': bench_transposition_table,
+    'move-ordering': bench_move_ordering,
+    'proof-cache': bench_proof_cache,
+    'make-unmake': bench_make_unmake,
+    'array-tree': bench_array_tree,
+    'expansion': bench_expansion,
+    'search-curve': bench_search_curve,
+    'batch-playouts': bench_batch_playouts,
+    'connect4': bench_connect4,
+    'catch-the-lion': bench_catch_the_lion,
+    'sequential': bench_sequential,
+    'dag': bench_dag,
+    'solver': bench_solver,
+    'rollout': bench_rollout,
+    'symmetry': bench_symmetry,
+    'book': bench_book,
+    'clock': bench_clock,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmarks', nargs='*', help=f'any of suite, {", ".join(BENCHMARKS)}')
+    parser.add_argument('--iterations', type=int, default=200, help='suite: iterations per search')
+    parser.add_argument('--positions', type=int, default=3, help='suite: mid-game positions per game')
+    parser.add_argument('--seed', type=int, default=0, help='suite: seed for positions and searches')
+    parser.add_argument('--games', nargs='+', choices=list(SUITE_GAMES), help='suite: games to run')
+    parser.add_argument('--algorithms', nargs='+', choices=list(SUITE_PARAMETERS), help='suite: algorithms to run')
+    parser.add_argument('--out', help='suite: write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    for name in args.benchmarks or BENCHMARKS:
+        if name == 'suite':
+            bench_suite(args.iterations, args.positions, args.seed, args.games, args.algorithms, args.out)
+        else:
+            BENCHMARKS[name]()
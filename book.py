@@ -0,0 +1,130 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from minimax import position_key
+from mcts import Node, SEARCHES
+import multiprocessing
+import argparse
+import numpy as np
+import random
+import zlib
+
+# One entry per position, sorted by key. move indexes book_moves() of the position, visits is the search's
+# confidence in it.
+ENTRY = np.dtype([('key', '<u8'), ('move', '<u2'), ('visits', '<u4')])
+KEY_MASK = (1 << 64) - 1
+# The last entry marks the format: key KEY_MASK sorts after every position, move holds BOOK_VERSION and
+# visits BOOK_MAGIC. The version goes up whenever keys or move indexes change meaning, version 2 being the
+# first with Zobrist canonical keys.
+BOOK_VERSION = 2
+BOOK_MAGIC = int.from_bytes(b'book', 'little')
+
+
+def book_moves(game):
+    # Key and legal moves of a position, the moves in canonical orientation and sorted so every symmetric
+    # orientation indexes them alike. Games without canonical() keep their Zobrist key and move order.
+    key, symmetry = position_key(game, symmetric=True)
+    if not hasattr(game, 'canonical'):
+        return key & KEY_MASK, list(game.moves()), 0
+    return key & KEY_MASK, sorted(game.canonical_move(move, symmetry) for move in game.moves()), symmetry
+
+
+def book_positions(game_creator, plies):
+    # Every position with fewer than plies moves played and a move to make, one per symmetry class
+    frontier = [game_creator()]
+    positions = {}
+    for _ in range(plies):
+        children = []
+        for game in frontier:
+            key = book_moves(game)[0]
+            if key in positions or len(game.moves()) == 0:
+                continue
+            positions[key] = game
+            for move in game.moves():
+                child = game.copy()
+                child.play(move)
+                children.append(child)
+        frontier = children
+    return positions
+
+
+def search_position(name, game, seed, kwargs):
+    random.seed(seed)
+    root = Node(game)
+    move = SEARCHES[name](game, root=root, **kwargs)
+    key, moves, symmetry = book_moves(game)
+    visits = max(child.visits for child in root.children if child.move == move) if root.children else 0
+    return key, moves.index(game.canonical_move(move, symmetry) if symmetry else move), visits
+
+
+def build_book(game_creator, path, plies=4, name='mcts', workers=None, seed=0, **kwargs):
+    # Searches every position of the first plies in parallel, one long search per process, and writes the
+    # sorted entries as a .npy file that OpeningBook maps without parsing. kwargs go to the search.
+    positions = book_positions(game_creator, plies)
+    kwargs.setdefault('duration', 10)
+    entries = np.zeros(len(positions) + 1, dtype=ENTRY)
+    with ProcessPoolExecutor(max_workers=workers or multiprocessing.cpu_count()) as executor:
+        futures = [executor.submit(search_position, name, game, zlib.crc32(f'{seed}/{key}'.encode()), kwargs)
+                   for key, game in positions.items()]
+        for k, future in enumerate(as_completed(futures)):
+            entries[k] = future.result()
+    entries[:-1].sort(order='key')
+    entries[-1] = (KEY_MASK, BOOK_VERSION, BOOK_MAGIC)
+    np.save(path, entries)
+    return len(positions)
+
+
+class OpeningBook:
+    # Read-only view of a book file. The entries stay memory mapped and a probe is one binary search over
+    # the keys. Pickles by path, so players holding a book can be sent to worker processes.
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = np.load(path, mmap_mode='r')
+        # A book of another format would answer probes with wrong moves, so it is refused outright
+        if self.entries.dtype != ENTRY or len(self.entries) == 0 or self.entries[-1]['key'] != KEY_MASK or \
+                self.entries[-1]['visits'] != BOOK_MAGIC:
+            raise Exception(f"{path} is not an opening book of a known format, rebuild it with book.py")
+        if self.entries[-1]['move'] != BOOK_VERSION:
+            raise Exception(f"{path} is a version {self.entries[-1]['move']} opening book, "
+                            f"this code reads version {BOOK_VERSION}, rebuild it with book.py")
+        self.keys = self.entries['key'][:-1]
+        self.probes = 0
+        self.hits = 0
+
+    def __reduce__(self):
+        return OpeningBook, (self.path,)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def probe(self, game):
+        self.probes += 1
+        key, moves, symmetry = book_moves(game)
+        index = int(np.searchsorted(self.keys, key))
+        if index == len(self.keys) or self.keys[index] != key:
+            return None
+        move = int(self.entries['move'][index])
+        if move >= len(moves):
+            return None  # a colliding key from another position
+        self.hits += 1
+        return game.real_move(moves[move], symmetry) if symmetry else moves[move]
+
+
+if __name__ == '__main__':
+    from othello import Othello, BitboardOthello
+    from catchTheLion import CatchTheLion
+    from connect4 import Connect4
+    games = {game.__name__: game for game in (Othello, BitboardOthello, CatchTheLion, Connect4)}
+    parser = argparse.ArgumentParser(description='Build an opening book')
+    parser.add_argument('game', choices=list(games))
+    parser.add_argument('out', help='book file, .npy')
+    parser.add_argument('--plies', type=int, default=4, help='positions with fewer moves played get an entry')
+    parser.add_argument('--search', default='mcts', choices=list(SEARCHES))
+    parser.add_argument('--duration', type=float, default=10, help='seconds per position')
+    parser.add_argument('--depth', type=int, help='minimax depth of the hybrid searches')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+    kwargs = dict(duration=args.duration, c=0.7)
+    if args.depth is not None:
+        kwargs['depth'] = args.depth
+    entries = build_book(games[args.game], args.out, args.plies, args.search, args.workers, **kwargs)
+    print(f'{entries} positions written to {args.out}')
@@ -1,8 +1,17 @@
-from functools import lru_cache
+from zobrist import UNKNOWN
 import numpy as np
+import zobrist
+
+
+PIECES = 'cgehlCGEHL'
+# BOARD_ZOBRIST[square][piece], HAND_ZOBRIST[player < 0][piece][copies already in hand]
+BOARD_ZOBRIST = zobrist.table(12, len(PIECES))
+HAND_ZOBRIST = zobrist.table(2, 5, 8)
 
 
 class CatchTheLion:
+    __slots__ = ('board', 'current_player', 'captured_pieces', 'zobrist', '_moves', '_winner')
+
     def __init__(self):
         self.board = np.array([
             ['G', 'L', 'E'],
@@ -12,27 +21,44 @@ class CatchTheLion:
         ])
         self.current_player = 1  # 1 for lowercase (bottom), -1 for uppercase (top)
         self.captured_pieces = {1: [], -1: []}  # Stores captured pieces for each player
+        self.zobrist = self.compute_zobrist()
+        self._moves = None
+        self._winner = UNKNOWN
 
     def copy(self):
         new_game = CatchTheLion()
         new_game.board = np.copy(self.board)
         new_game.current_player = self.current_player
         new_game.captured_pieces = {1: self.captured_pieces[1][:], -1: self.captured_pieces[-1][:]}
+        new_game.zobrist = self.zobrist
         return new_game
 
+    def compute_zobrist(self):
+        h = zobrist.SIDE if self.current_player == -1 else 0
+        for row in range(4):
+            for col in range(3):
+                if self.board[row, col] != ' ':
+                    h ^= BOARD_ZOBRIST[row * 3 + col][PIECES.index(self.board[row, col])]
+        for player, pieces in self.captured_pieces.items():
+            for piece in set(pieces):
+                for count in range(pieces.count(piece)):
+                    h ^= HAND_ZOBRIST[player < 0][PIECES.index(piece)][count]
+        return h
+
+    def key(self):
+        hands = tuple(tuple(sorted(self.captured_pieces[player])) for player in (1, -1))
+        return self.current_player, self.board.tobytes(), hands
+
     def clear_cache(self):
-        self.moves.cache_clear()
-        self.player_name.cache_clear()
-        self.opposite_player.cache_clear()
-        self.winner.cache_clear()
-        self.__str__.cache_clear()
-        self.is_current_player_piece.cache_clear()
-        self.__is_valid_move.cache_clear()
+        self._moves = None
+        self._winner = UNKNOWN
 
     def play(self, move):
+        token = [move, None, None, self.zobrist, self._moves, self._winner]
         if isinstance(move, tuple) and len(move) == 2:  # Regular move
             (src_row, src_col), (dst_row, dst_col) = move
             piece = self.board[src_row, src_col]
+            token[1], token[2] = piece, self.board[dst_row, dst_col]
 
             if self.board[dst_row, dst_col] != ' ':
                 self.capture_piece(dst_row, dst_col)
@@ -43,16 +69,41 @@ class CatchTheLion:
             if piece.lower() == 'c' and dst_row == (3 if self.current_player == 1 else 0):
                 self.board[dst_row, dst_col] = 'h' if self.current_player == 1 else 'H'  # Promote Chick to Chicken
 
+            self.zobrist ^= BOARD_ZOBRIST[src_row * 3 + src_col][PIECES.index(piece)]
+            self.zobrist ^= BOARD_ZOBRIST[dst_row * 3 + dst_col][PIECES.index(self.board[dst_row, dst_col])]
+
         elif isinstance(move, tuple) and len(move) == 3:  # Drop move
             piece, dst_row, dst_col = move
             self.board[dst_row, dst_col] = piece.lower() if self.current_player == 1 else piece.upper()
-            self.captured_pieces[self.current_player].remove(piece)
+            token[1] = self.captured_pieces[self.current_player].index(piece)
+            del self.captured_pieces[self.current_player][token[1]]
+            self.zobrist ^= BOARD_ZOBRIST[dst_row * 3 + dst_col][PIECES.index(self.board[dst_row, dst_col])]
+            self.zobrist ^= HAND_ZOBRIST[self.current_player < 0][PIECES.index(piece)][self.captured_pieces[self.current_player].count(piece)]
 
         self.switch_player()
         self.clear_cache()
+        return token
+
+    def undo(self, token):
+        move, piece, captured, self.zobrist, self._moves, self._winner = token
+        self.current_player = -self.current_player
+        if len(move) == 2:
+            (src_row, src_col), (dst_row, dst_col) = move
+            self.board[src_row, src_col] = piece
+            self.board[dst_row, dst_col] = captured
+            if captured != ' ':
+                self.captured_pieces[self.current_player].pop()
+        else:
+            hand_piece, dst_row, dst_col = move
+            self.board[dst_row, dst_col] = ' '
+            self.captured_pieces[self.current_player].insert(piece, hand_piece)
 
-    @lru_cache(maxsize=None)
     def moves(self):
+        if self._moves is None:
+            self._moves = self.generate_moves()
+        return self._moves
+
+    def generate_moves(self):
         if self.winner() is not None:
             return []
 
@@ -83,38 +134,39 @@ class CatchTheLion:
 
         return possible_moves
 
-    @lru_cache(maxsize=None)
+    def is_capture(self, move):
+        return len(move) == 2 and self.board[move[1]] != ' '
+
     def player_name(self):
         if self.current_player == 1:
             return 'X'
         return 'O'
 
-    @lru_cache(maxsize=None)
     def opposite_player(self):
         if self.current_player == -1:
             return 'X'
         return 'O'
 
-    @lru_cache(maxsize=None)
     def winner(self):
-        if 'L' not in self.board:
-            return 'X'
-        if 'l' not in self.board:
-            return 'O'
+        if self._winner is UNKNOWN:
+            self._winner = None
+            if 'L' not in self.board:
+                self._winner = 'X'
+            elif 'l' not in self.board:
+                self._winner = 'O'
+        return self._winner
 
-    @lru_cache(maxsize=None)
     def __str__(self):
         return "\n".join(" | ".join(row) for row in self.board) + '\n'
 
     def switch_player(self):
         self.current_player = -self.current_player
+        self.zobrist ^= zobrist.SIDE
 
-    @lru_cache(maxsize=None)
     def is_current_player_piece(self, row, col):
         piece = self.board[row, col]
         return (piece.islower() and self.current_player == 1) or (piece.isupper() and self.current_player == -1)
 
-    @lru_cache(maxsize=None)
     def __is_valid_move(self, dst_row, dst_col):
         if not (0 <= dst_row < 4 and 0 <= dst_col < 3):
             return False
@@ -122,5 +174,190 @@ class CatchTheLion:
 
     def capture_piece(self, row, col):
         piece = self.board[row, col].lower()
+        self.zobrist ^= BOARD_ZOBRIST[row * 3 + col][PIECES.index(self.board[row, col])]
+        self.zobrist ^= HAND_ZOBRIST[self.current_player < 0][PIECES.index(piece)][self.captured_pieces[self.current_player].count(piece)]
         self.captured_pieces[self.current_player].append(piece)
-        self.board[row, col] = ' '
\ No newline at end of file
+        self.board[row, col] = ' '
+
+CHICK, GIRAFFE, ELEPHANT, HEN, LION = 1, 2, 3, 4, 5
+LETTERS = ' cgehl'
+DIRECTIONS = {
+    CHICK: [(1, 0)],
+    GIRAFFE: [(0, -1), (0, 1), (-1, 0), (1, 0)],
+    ELEPHANT: [(-1, -1), (-1, 1), (1, -1), (1, 1)],
+    HEN: [(-1, 0), (1, 0), (0, -1), (0, 1), (1, 1), (1, -1)],
+    LION: [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)],
+}
+
+
+def destinations(player, piece, square):
+    row, col = divmod(square, 3)
+    result = []
+    for dr, dc in DIRECTIONS[piece]:
+        r, c = row - player * dr, col + dc
+        if 0 <= r < 4 and 0 <= c < 3:
+            result.append(r * 3 + c)
+    return tuple(result)
+
+
+# DESTINATIONS[player][piece][square] and the move tuples CatchTheLion uses, built once
+DESTINATIONS = {player: [None] + [[destinations(player, piece, square) for square in range(12)]
+                                  for piece in DIRECTIONS] for player in (1, -1)}
+BOARD_MOVES = [[(divmod(src, 3), divmod(dst, 3)) for dst in range(12)] for src in range(12)]
+DROP_MOVES = [None] + [[(LETTERS[piece],) + divmod(square, 3) for square in range(12)] for piece in DIRECTIONS]
+# Zobrist index of a signed piece code, matching PIECES so both classes hash positions alike
+ZOBRIST_INDEX = {code * player: PIECES.index(LETTERS[code] if player == 1 else LETTERS[code].upper())
+                 for code in DIRECTIONS for player in (1, -1)}
+HAND_BITS = 3
+
+
+def hand_shift(player, piece):
+    return 5 * HAND_BITS * (player < 0) + HAND_BITS * (piece - 1)
+
+
+class EncodedCatchTheLion:
+    # Same rules, moves and move tuples as CatchTheLion. The board is a list of 12 signed piece codes
+    # (positive for the lowercase player 1) and both hands are packed into one int, 3 bits per piece count.
+    __slots__ = ('board', 'current_player', 'hands', 'zobrist', '_moves', '_winner')
+
+    def __init__(self, board=None, current_player=1, hands=0, zobrist=None, winner=None):
+        if board is None:
+            board = [-GIRAFFE, -LION, -ELEPHANT,
+                     0, -CHICK, 0,
+                     0, CHICK, 0,
+                     ELEPHANT, LION, GIRAFFE]
+        self.board = board
+        self.current_player = current_player
+        self.hands = hands
+        self.zobrist = self.compute_zobrist() if zobrist is None else zobrist
+        self._moves = None
+        self._winner = winner
+
+    @classmethod
+    def from_catch_the_lion(cls, game):
+        board = []
+        for letter in game.board.flatten():
+            code = LETTERS.index(letter.lower()) if letter != ' ' else 0
+            board.append(code if letter.islower() else -code)
+        hands = 0
+        for player, pieces in game.captured_pieces.items():
+            for letter in pieces:
+                hands += 1 << hand_shift(player, LETTERS.index(letter))
+        return cls(board, game.current_player, hands, winner=game.winner())
+
+    def copy(self):
+        return EncodedCatchTheLion(self.board[:], self.current_player, self.hands, self.zobrist, self._winner)
+
+    def compute_zobrist(self):
+        h = zobrist.SIDE if self.current_player == -1 else 0
+        for square, code in enumerate(self.board):
+            if code != 0:
+                h ^= BOARD_ZOBRIST[square][ZOBRIST_INDEX[code]]
+        for player in (1, -1):
+            for piece in DIRECTIONS:
+                for count in range(self.hand_count(player, piece)):
+                    h ^= HAND_ZOBRIST[player < 0][piece - 1][count]
+        return h
+
+    def key(self):
+        return self.current_player, tuple(self.board), self.hands
+
+    def hand_count(self, player, piece):
+        return (self.hands >> hand_shift(player, piece)) & 7
+
+    def play(self, move):
+        player = self.current_player
+        board = self.board
+        h = self.zobrist ^ zobrist.SIDE
+        if len(move) == 2:  # Regular move
+            (src_row, src_col), (dst_row, dst_col) = move
+            src, dst = src_row * 3 + src_col, dst_row * 3 + dst_col
+            moved, captured = board[src], board[dst]
+            token = (src, dst, moved, captured, self.hands, self.zobrist, self._moves, self._winner)
+            h ^= BOARD_ZOBRIST[src][ZOBRIST_INDEX[moved]]
+            if captured != 0:
+                piece = -captured * player
+                h ^= BOARD_ZOBRIST[dst][ZOBRIST_INDEX[captured]]
+                h ^= HAND_ZOBRIST[player < 0][piece - 1][self.hand_count(player, piece)]
+                self.hands += 1 << hand_shift(player, piece)
+                if piece == LION:
+                    self._winner = 'X' if player == 1 else 'O'
+            if moved * player == CHICK and dst_row == (3 if player == 1 else 0):
+                moved = HEN * player  # Promote Chick to Chicken
+            board[dst] = moved
+            board[src] = 0
+            h ^= BOARD_ZOBRIST[dst][ZOBRIST_INDEX[moved]]
+        else:  # Drop move
+            letter, dst_row, dst_col = move
+            dst, piece = dst_row * 3 + dst_col, LETTERS.index(letter)
+            token = (None, dst, None, None, self.hands, self.zobrist, self._moves, self._winner)
+            self.hands -= 1 << hand_shift(player, piece)
+            h ^= HAND_ZOBRIST[player < 0][piece - 1][self.hand_count(player, piece)]
+            board[dst] = piece * player
+            h ^= BOARD_ZOBRIST[dst][ZOBRIST_INDEX[piece * player]]
+        self.zobrist = h
+        self.current_player = -player
+        self._moves = None
+        return token
+
+    def undo(self, token):
+        src, dst, moved, captured, self.hands, self.zobrist, self._moves, self._winner = token
+        self.current_player = -self.current_player
+        if src is None:
+            self.board[dst] = 0
+        else:
+            self.board[src] = moved
+            self.board[dst] = captured
+
+    def moves(self):
+        if self._moves is None:
+            self._moves = self.generate_moves()
+        return self._moves
+
+    def generate_moves(self):
+        if self._winner is not None:
+            return []
+
+        player = self.current_player
+        board = self.board
+        tables = DESTINATIONS[player]
+        possible_moves = []
+        for src in range(12):
+            piece = board[src] * player
+            if piece > 0:
+                for dst in tables[piece][src]:
+                    if board[dst] * player <= 0:
+                        possible_moves.append(BOARD_MOVES[src][dst])
+
+        # One set of drops per copy in hand, as CatchTheLion does
+        if self.hands >> hand_shift(player, CHICK) & 0x7fff:
+            empty = [square for square in range(12) if board[square] == 0]
+            for piece in DIRECTIONS:
+                drops = DROP_MOVES[piece]
+                for _ in range(self.hand_count(player, piece)):
+                    possible_moves.extend(drops[square] for square in empty)
+
+        return possible_moves
+
+    def is_capture(self, move):
+        if len(move) == 3:
+            return False
+        dst_row, dst_col = move[1]
+        return self.board[dst_row * 3 + dst_col] != 0
+
+    def player_name(self):
+        if self.current_player == 1:
+            return 'X'
+        return 'O'
+
+    def opposite_player(self):
+        if self.current_player == -1:
+            return 'X'
+        return 'O'
+
+    def winner(self):
+        return self._winner
+
+    def __str__(self):
+        letters = [LETTERS[code] if code >= 0 else LETTERS[-code].upper() for code in self.board]
+        return "\n".join(" | ".join(letters[row * 3:row * 3 + 3]) for row in range(4)) + '\n'
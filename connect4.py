@@ -1,53 +1,120 @@
 from scipy.signal import convolve2d
-from functools import lru_cache
+from zobrist import UNKNOWN
 import numpy as np
+import zobrist
+
+
+# ZOBRIST[col][row][player < 0]
+ZOBRIST = zobrist.table(7, 6, 2)
+
+
+def board_zobrist(player, board):
+    h = zobrist.SIDE if player == -1 else 0
+    for col, row in zip(*np.nonzero(board)):
+        h ^= ZOBRIST[col][row][int(board[col, row] < 0)]
+    return h
 
 
 class Connect4:
+    __slots__ = ('player', 'board', 'heights', 'zobrist', '_moves', '_winner')
     COLS = 7
     ROWS = 6
 
-    def __init__(self, player=1, board=None):
+    def __init__(self, player=1, board=None, zobrist=None, heights=None):
         self.player = player
         if board is None:
             self.board = np.zeros((Connect4.COLS, Connect4.ROWS), dtype=int).copy()
         else:
             self.board = board
+        # Number of discs per column, so play() finds the landing row without scanning the column
+        self.heights = [int(np.count_nonzero(column)) for column in self.board] if heights is None else heights
+        self.zobrist = self.compute_zobrist() if zobrist is None else zobrist
+        self._moves = None
+        self._winner = UNKNOWN
 
     def copy(self):
-        return Connect4(self.player, self.board.copy())
+        game = Connect4(self.player, self.board.copy(), self.zobrist, self.heights[:])
+        game._winner = self._winner
+        return game
+
+    def compute_zobrist(self):
+        return board_zobrist(self.player, self.board)
+
+    def key(self):
+        return self.player, self.board.tobytes()
+
+    def canonical(self):
+        # Zobrist hash of the smaller of the board and its left/right mirror, symmetry 1 for the mirror
+        boards = [int.from_bytes(board.tobytes(), 'little') for board in (self.board, self.board[::-1])]
+        if boards[1] < boards[0]:
+            return board_zobrist(self.player, self.board[::-1]), 1
+        return self.zobrist, 0
+
+    def canonical_move(self, move, symmetry):
+        return Connect4.COLS - 1 - move if symmetry else move
+
+    def real_move(self, move, symmetry):
+        return self.canonical_move(move, symmetry)
 
     def clear_cache(self):
-        self.moves.cache_clear()
-        self.player_name.cache_clear()
-        self.opposite_player.cache_clear()
-        self.winner.cache_clear()
-        self.__str__.cache_clear()
+        self._moves = None
+        self._winner = UNKNOWN
 
     def play(self, col):
-        row = np.where(self.board[col] == 0)[0][-1]
+        row = Connect4.ROWS - 1 - self.heights[col]
+        token = (col, row, self.zobrist, self._moves, self._winner)
         self.board[col][row] = self.player
+        self.heights[col] += 1
+        self.zobrist ^= ZOBRIST[col][row][self.player < 0] ^ zobrist.SIDE
         self.player = -self.player
         self.clear_cache()
+        # Only lines through the new disc can have become a win
+        self._winner = self.line_winner(col, row)
+        return token
+
+    def undo(self, token):
+        col, row, self.zobrist, self._moves, self._winner = token
+        self.board[col][row] = 0
+        self.heights[col] -= 1
+        self.player = -self.player
+
+    def line_winner(self, col, row):
+        player = self.board[col, row]
+        for dc, dr in ((1, 0), (0, 1), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                c, r = col + sign * dc, row + sign * dr
+                while 0 <= c < Connect4.COLS and 0 <= r < Connect4.ROWS and self.board[c, r] == player:
+                    count += 1
+                    c, r = c + sign * dc, r + sign * dr
+            if count >= 4:
+                return 'X' if player == 1 else 'O'
 
-    @lru_cache(maxsize=None)
     def moves(self):
-        if self.winner():
-            return np.asarray([])
-        return np.where((self.board == 0).max(axis=1))[0]
+        if self._moves is None:
+            if self.winner():
+                self._moves = []
+            else:
+                self._moves = [col for col in range(Connect4.COLS) if self.heights[col] < Connect4.ROWS]
+        return self._moves
+
+    def empties(self):
+        return Connect4.ROWS * Connect4.COLS - sum(self.heights)
 
-    @lru_cache(maxsize=None)
     def player_name(self):
         if self.player==1: return 'X'
         else: return 'O'
 
-    @lru_cache(maxsize=None)
     def opposite_player(self):
         if self.player==-1: return 'X'
         else: return 'O'
 
-    @lru_cache(maxsize=None)
     def winner(self):
+        if self._winner is UNKNOWN:
+            self._winner = self.board_winner()
+        return self._winner
+
+    def board_winner(self):
         result = convolve2d(self.board, np.ones((1, 4))/4, mode='valid')
         if np.any(result == 1): return 'X'
         elif np.any(result == -1): return 'O'
@@ -61,7 +128,6 @@ class Connect4:
         if np.any(result == 1): return 'X'
         elif np.any(result == -1): return 'O'
 
-    @lru_cache(maxsize=None)
     def __str__(self):
         result = ''
         for i, col in enumerate(self.board.T):
@@ -1,132 +1,164 @@
-from concurrent.futures import ProcessPoolExecutor
-from utils import simulate_series, Player
+from tournament import Experiment, run_tournament, savings, time_report, EXPECTED_PLIES
 from catchTheLion import CatchTheLion
+from utils import Player
 from othello import Othello
-import multiprocessing
-
-
-def experiment(game, n_games, player1, player2, file_name):
-    print(f'Starting {file_name}\n')
-    results = simulate_series(game, n_games, player1, player2)
-    with open(f'{file_name}', 'w') as f:
-        f.write(f'{results}')
-    print(f'Finished {file_name} with result: {results}\n')
+import argparse
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--adaptive', action='store_true', help='stop each pairing once an SPRT decides it')
+    arguments = parser.parse_args()
     n_games = 100
-    with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-        # Play Othello mcts-mr on depth
-        for depth in range(1, 5):
-            executor.submit(
-                experiment, Othello, n_games,
-                Player('mcts', duration=1, c=0.7),
-                Player('mcts-mr', duration=1, c=0.7, depth=depth),
-                f'Othello - mcts vs mcts-mr-{depth}'
-            )
+    experiments = []
+    # Play Othello mcts-mr on depth
+    for depth in range(1, 5):
+        experiments.append(Experiment(
+            f'Othello - mcts vs mcts-mr-{depth}', Othello,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-mr', duration=1, c=0.7, depth=depth),
+            n_games
+        ))
 
-        # Play Othello mcts-mb on depth
-        for depth in range(1, 7):
-            executor.submit(
-                experiment, Othello, n_games,
-                Player('mcts', duration=1, c=0.7),
-                Player('mcts-mb', duration=1, c=0.7, depth=depth),
-                f'Othello - mcts vs mcts-mb-{depth}'
-            )
+    # Play Othello mcts-mb on depth
+    for depth in range(1, 7):
+        experiments.append(Experiment(
+            f'Othello - mcts vs mcts-mb-{depth}', Othello,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-mb', duration=1, c=0.7, depth=depth),
+            n_games
+        ))
 
-        # Play Othello mcts-ms (2 and 4) on visits
-        for visits in [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]:
-            executor.submit(
-                experiment, Othello, n_games,
-                Player('mcts', duration=1, c=0.7),
-                Player('mcts-ms', duration=1, c=0.7, depth=2, visits=visits),
-                f'Othello - mcts vs mcts-ms-2-visits-{visits}'
-            )
-            executor.submit(
-                experiment, Othello, n_games,
-                Player('mcts', duration=1, c=0.7),
-                Player('mcts-ms', duration=1, c=0.7, depth=4, visits=visits),
-                f'Othello - mcts vs mcts-ms-4-visits-{visits}'
-            )
+    # Play Othello mcts-ms (2 and 4) on visits
+    for visits in [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]:
+        experiments.append(Experiment(
+            f'Othello - mcts vs mcts-ms-2-visits-{visits}', Othello,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-ms', duration=1, c=0.7, depth=2, visits=visits),
+            n_games
+        ))
+        experiments.append(Experiment(
+            f'Othello - mcts vs mcts-ms-4-visits-{visits}', Othello,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-ms', duration=1, c=0.7, depth=4, visits=visits),
+            n_games
+        ))
 
-        # play Othello best models on duration
-        for duration in [0.25, 0.5, 1, 2.5, 5]:
-            executor.submit(
-                experiment, Othello, n_games,
-                Player('mcts', duration=duration, c=0.7),
-                Player('mcts-mr', duration=duration, c=0.7, depth=1),
-                f'Othello - mcts vs mcts-mr-1 with duration {duration}'
-            )
-            executor.submit(
-                experiment, Othello, n_games,
-                Player('mcts', duration=duration, c=0.7),
-                Player('mcts-ms', duration=duration, c=0.7, depth=2, visits=50),
-                f'Othello - mcts vs mcts-ms-2-visits-50 with duration {duration}'
-            )
-            executor.submit(
-                experiment, Othello, n_games,
-                Player('mcts', duration=duration, c=0.7),
-                Player('mcts-mb', duration=duration, c=0.7, depth=2),
-                f'Othello - mcts vs mcts-mb-2 with duration {duration}'
-            )
+    # play Othello best models on duration
+    for duration in [0.25, 0.5, 1, 2.5, 5]:
+        experiments.append(Experiment(
+            f'Othello - mcts vs mcts-mr-1 with duration {duration}', Othello,
+            Player('mcts', duration=duration, c=0.7),
+            Player('mcts-mr', duration=duration, c=0.7, depth=1),
+            n_games
+        ))
+        experiments.append(Experiment(
+            f'Othello - mcts vs mcts-ms-2-visits-50 with duration {duration}', Othello,
+            Player('mcts', duration=duration, c=0.7),
+            Player('mcts-ms', duration=duration, c=0.7, depth=2, visits=50),
+            n_games
+        ))
+        experiments.append(Experiment(
+            f'Othello - mcts vs mcts-mb-2 with duration {duration}', Othello,
+            Player('mcts', duration=duration, c=0.7),
+            Player('mcts-mb', duration=duration, c=0.7, depth=2),
+            n_games
+        ))
 
-        # Play Catch The Lion mcts-mr on depth
-        for depth in range(1, 5):
-            executor.submit(
-                experiment, CatchTheLion, n_games,
-                Player('mcts', duration=1, c=0.7),
-                Player('mcts-mr', duration=1, c=0.7, depth=depth),
-                f'CatchTheLion - mcts vs mcts-mr-{depth}'
-            )
+    # Play Catch The Lion mcts-mr on depth
+    for depth in range(1, 5):
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-mr-{depth}', CatchTheLion,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-mr', duration=1, c=0.7, depth=depth),
+            n_games
+        ))
 
-        # Play Catch The Lion mcts-mb on depth
-        for depth in range(1, 7):
-            executor.submit(
-                experiment, CatchTheLion, n_games,
-                Player('mcts', duration=1, c=0.7),
-                Player('mcts-mb', duration=1, c=0.7, depth=depth),
-                f'CatchTheLion - mcts vs mcts-mb-{depth}'
-            )
-            # Play mcts-ms (2 and 4) on visits
+    # Play Catch The Lion mcts-mb on depth
+    for depth in range(1, 7):
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-mb-{depth}', CatchTheLion,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-mb', duration=1, c=0.7, depth=depth),
+            n_games
+        ))
+        # Play mcts-ms (2 and 4) on visits
 
-        # Play Catch The Lion  mcts-ms (2, 4 and 6) on visits
-        for visits in [0, 1, 2, 5, 10, 20, 50, 100]:
-            executor.submit(
-                experiment, CatchTheLion, n_games,
-                Player('mcts', duration=1, c=0.7),
-                Player('mcts-ms', duration=1, c=0.7, depth=2, visits=visits),
-                f'CatchTheLion - mcts vs mcts-ms-2-visits-{visits}'
-              )
-            executor.submit(
-                experiment, CatchTheLion, n_games,
+    # Play Catch The Lion  mcts-ms (2, 4 and 6) on visits
+    for visits in [0, 1, 2, 5, 10, 20, 50, 100]:
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-ms-2-visits-{visits}', CatchTheLion,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-ms', duration=1, c=0.7, depth=2, visits=visits),
+            n_games
+        ))
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-ms-4-visits-{visits}', CatchTheLion,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-ms', duration=1, c=0.7, depth=4, visits=visits),
+            n_games
+        ))
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-ms-6-visits-{visits}', CatchTheLion,
+            Player('mcts', duration=1, c=0.7),
+            Player('mcts-ms', duration=1, c=0.7, depth=6, visits=visits),
+            n_games
+        ))
+
+    # play CatchTheLion best models on duration
+    for duration in [0.25, 0.5, 1, 2.5, 5]:
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-mr-1 with duration {duration}', CatchTheLion,
+            Player('mcts', duration=duration, c=0.7),
+            Player('mcts-mr', duration=duration, c=0.7, depth=1),
+            n_games
+        ))
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-ms-4-visits-2 with duration {duration}', CatchTheLion,
+            Player('mcts', duration=duration, c=0.7),
+            Player('mcts-ms', duration=duration, c=0.7, depth=4, visits=2),
+            n_games
+        ))
+        experiments.append(Experiment(
+            f'CatchTheLion - mcts vs mcts-mb-4 with duration {duration}', CatchTheLion,
+            Player('mcts', duration=duration, c=0.7),
+            Player('mcts-mb', duration=duration, c=0.7, depth=4),
+            n_games
+        ))
+
+    # Play both games with the rollout policies against uniform playouts to the end
+    for game in [Othello, CatchTheLion]:
+        for rollout in ['weighted', 'cutoff', 'weighted-cutoff']:
+            experiments.append(Experiment(
+                f'{game.__name__} - mcts vs mcts-{rollout}', game,
                 Player('mcts', duration=1, c=0.7),
-                Player('mcts-ms', duration=1, c=0.7, depth=4, visits=visits),
-                f'CatchTheLion - mcts vs mcts-ms-4-visits-{visits}'
-              )
-            executor.submit(
-                experiment, CatchTheLion, n_games,
+                Player('mcts', duration=1, c=0.7, rollout=rollout, label=f'mcts-{rollout}'),
+                n_games
+            ))
+
+    # Play a game clock set to the fixed player's expected time, and to half of it
+    clock_experiments = []
+    for game in [Othello, CatchTheLion]:
+        for share in [1, 0.5]:
+            clock_experiments.append(Experiment(
+                f'{game.__name__} - mcts vs mcts-clock-{share}', game,
                 Player('mcts', duration=1, c=0.7),
-                Player('mcts-ms', duration=1, c=0.7, depth=6, visits=visits),
-                f'CatchTheLion - mcts vs mcts-ms-6-visits-{visits}'
-            )
+                Player('mcts', clock=EXPECTED_PLIES[game.__name__] / 2 * share, c=0.7, label=f'mcts-clock-{share}'),
+                n_games
+            ))
+    experiments += clock_experiments
+
+    results = run_tournament(experiments, 'results.jsonl', adaptive=arguments.adaptive)
+    for name, winners in results.items():
+        with open(name, 'w') as f:
+            f.write(f'{winners}')
+        print(f'Finished {name} with result: {winners}\n')
+
+    # Games a sequential test would have needed per configuration, for comparison with the fixed n_games
+    for name, report in savings('results.jsonl', [experiment.name for experiment in experiments]).items():
+        outcome = {1: 'first player stronger', -1: 'first player weaker', 0: 'undecided'}[report['decision']]
+        print(f'{name}: {outcome} after {report["needed"]} of {report["played"]} games')
 
-        # play CatchTheLion best models on duration
-        for duration in [0.25, 0.5, 1, 2.5, 5]:
-            executor.submit(
-                experiment, CatchTheLion, n_games,
-                Player('mcts', duration=duration, c=0.7),
-                Player('mcts-mr', duration=duration, c=0.7, depth=1),
-                f'CatchTheLion - mcts vs mcts-mr-1 with duration {duration}'
-            )
-            executor.submit(
-                experiment, CatchTheLion, n_games,
-                Player('mcts', duration=duration, c=0.7),
-                Player('mcts-ms', duration=duration, c=0.7, depth=4, visits=2),
-                f'CatchTheLion - mcts vs mcts-ms-4-visits-2 with duration {duration}'
-            )
-            executor.submit(
-                experiment, CatchTheLion, n_games,
-                Player('mcts', duration=duration, c=0.7),
-                Player('mcts-mb', duration=duration, c=0.7, depth=4),
-                f'CatchTheLion - mcts vs mcts-mb-4 with duration {duration}'
-            )
+    # Search time per game of the fixed and the clocked player
+    for name, (fixed, clock) in time_report('results.jsonl', [e.name for e in clock_experiments]).items():
+        print(f'{name}: {fixed:.1f}s fixed, {clock:.1f}s clock per game ({1 - clock / fixed:.0%} saved)')
@@ -1,21 +1,112 @@
-from statistics import mean, stdev
-from minimax import minimax
+from minimax import minimax, prove, position_key, TranspositionTable
+from arraytree import ArrayTree
+from rollout import simulate_leaf, simulate_leaf_batch, rollout_policy
 import math
 import random
 import time
 
 
+PHASES = ('select', 'expand', 'simulate', 'backpropagation', 'minimax')
+
+
+class SearchStats:
+    # Optional sink for search instrumentation. Hooks are written as `stats and stats.hook(...)`,
+    # so a disabled search (stats=None) pays one falsy check per phase.
+
+    def __init__(self):
+        self.searches = 0
+        self.iterations = 0
+        self.playouts = 0
+        self.terminal_leaves = 0
+        self.minimax_calls = 0
+        self.minimax_nodes = 0
+        self.minimax_proven = 0
+        self.backpropagation_proven = 0
+        self.solver_proven = 0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.tree_size = 0
+        self.seconds = 0
+        self.times = dict.fromkeys(PHASES, 0)
+
+    def clock(self):
+        # Ticks carry the minimax time so far, a phase that runs minimax inside (mcts-mb backprop) excludes it
+        return time.perf_counter(), self.times['minimax']
+
+    def lap(self, phase, tick):
+        now = time.perf_counter()
+        self.times[phase] += now - tick[0] - (self.times['minimax'] - tick[1])
+        return now, self.times['minimax']
+
+    def minimax(self, game, depth, table=None, max_nodes=None):
+        start = time.perf_counter()
+        counter = {}
+        result = minimax(game, depth, table, counter, max_nodes=max_nodes)
+        self.times['minimax'] += time.perf_counter() - start
+        self.minimax_calls += 1
+        self.minimax_nodes += counter['nodes']
+        self.minimax_proven += result != 0
+        return result
+
+    def simulated(self, playouts):
+        self.playouts += playouts
+
+    def solved(self):
+        self.solver_proven += 1
+
+    def terminal_leaf(self):
+        self.terminal_leaves += 1
+
+    def proven(self, already_terminal):
+        self.backpropagation_proven += not already_terminal
+
+    def descended(self, depth):
+        self.iterations += 1
+        self.depth_total += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def finished(self, root, start):
+        self.searches += 1
+        self.tree_size += root.subtree_size()
+        self.seconds += time.time() - start
+
+    def merge(self, other):
+        for name, value in vars(other).items():
+            if name == 'times':
+                for phase in PHASES:
+                    self.times[phase] += value[phase]
+            elif name == 'max_depth':
+                self.max_depth = max(self.max_depth, value)
+            else:
+                setattr(self, name, getattr(self, name) + value)
+        return self
+
+    def as_dict(self):
+        result = {name: value for name, value in vars(self).items() if name != 'times'}
+        result['times'] = dict(self.times)
+        result['mean_depth'] = self.depth_total / self.iterations if self.iterations else 0
+        result['mean_tree_size'] = self.tree_size / self.searches if self.searches else 0
+        result['iterations_per_second'] = self.iterations / self.seconds if self.seconds else 0
+        return result
+
+    def __repr__(self):
+        return f"SearchStats({self.as_dict()})"
+
 
 class Node:
 
     def __init__(self, game, move=None, parent=None):
-        # self.value = 0
-        self.value = []
+        # Running statistics of the playout values (Welford), updated in O(1) per backpropagation
+        self.count = 0
+        self.mean = 0
+        self.m2 = 0
         self.visits = 0
         self.game = game
         self.move = move
         self.parent = parent
         self.children = []
+        # Moves without a child yet, generated on first expansion (None before), in reverse generation order
+        self.untried = None
         self.is_terminal = False
         self.terminal_value = 0
         self.minimax_tested = False
@@ -28,28 +119,63 @@ class Node:
             return self.terminal_value
 
         ucb = math.log(self.parent.visits / self.visits)
-        avg = mean(self.value)
-        std = stdev(self.value, avg) if len(self.value) > 1 else 0
-        return avg + c * math.sqrt(ucb * min(1/4, std + 2*ucb))
+        std = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0
+        return self.mean + c * math.sqrt(ucb * min(1/4, std + 2*ucb))
+
+    def add_value(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
 
     def best_move(self, c):
         return max(self.children, key=lambda child: child.weight(c)).move
 
+    def subtree_size(self):
+        return 1 + sum(child.subtree_size() for child in self.children)
+
+    def prune(self, max_nodes):
+        # Keeps the shallowest max_nodes nodes, leaves cut below that are re-expanded on demand
+        kept = 1
+        frontier = [self]
+        while len(frontier) > 0:
+            next_frontier = []
+            for node in frontier:
+                if kept + len(node.children) > max_nodes:
+                    node.children = []
+                    node.untried = None
+                else:
+                    kept += len(node.children)
+                    next_frontier.extend(node.children)
+            frontier = next_frontier
+
     def non_terminal_children(self):
         return [child for child in self.children if not child.is_terminal]
 
+    def is_leaf(self):
+        return not self.untried and len(self.non_terminal_children()) == 0
+
     def select(self, c):
+        # Untried moves come first, as unvisited children would with their infinite weight
+        if self.untried:
+            return self.add_child(self.untried.pop())
         return max(self.non_terminal_children(), key=lambda child: child.weight(c))
 
-    def expand(self):
-        for move in self.game.moves():
-            child_game = self.game.copy()
-            child_game.play(move)
-            self.children.append(Node(child_game, move, self))
+    def add_child(self, move):
+        child_game = self.game.copy()
+        child_game.play(move)
+        child = Node(child_game, move, self)
+        self.children.append(child)
+        return child
 
+    def expand(self):
+        # Only the child that is played out gets a state, the other moves wait in untried for selection
+        if self.untried is None:
+            self.untried = self.game.moves()[::-1]
+        if self.untried:
+            return self.add_child(self.untried.pop(random.randrange(len(self.untried))))
         if len(self.children) == 0:
             return self
-
         return random.choice(self.children)
 
     def declare_terminal(self, winner):
@@ -59,141 +185,355 @@ class Node:
         elif winner is not None:
             self.terminal_value = -math.inf
 
-    def simulate(self):
-        if winner := self.game.winner():
-            self.declare_terminal(winner)
+    def declare_draw(self):
+        self.is_terminal = True
+
+    def simulate(self, stats=None, solver=None, rollout=None):
+        return simulate_leaf(self, stats, solver, rollout)
 
-        simulation_game = self.game.copy()
-        while len(moves := simulation_game.moves()) > 0:
-            simulation_game.play(random.choice(moves))
-        return simulation_game.winner()
+    def simulate_batch(self, playouts, stats=None, solver=None, rollout=None):
+        return simulate_leaf_batch(self, playouts, stats, solver, rollout)
 
-    def minimax(self, depth):
+    def minimax(self, depth, table=None, stats=None, max_nodes=None, proofs=None):
         if not self.minimax_tested:
             self.minimax_tested = True
-            minimax_result = minimax(self.game, depth)
+            minimax_result = prove(self.game, depth, table, stats, max_nodes, proofs)
             if minimax_result != 0:
                 winner = self.game.player_name() if minimax_result == math.inf else self.game.opposite_player()
                 # winner = self.game.opposite_player() if minimax_result == math.inf else self.game.player_name()
                 self.declare_terminal(winner)
                 return winner
 
-    def backpropagation(self, winner):
+    def backpropagation(self, winner, stats=None):
         self.visits += 1
         if winner != self.game.player_name():
-            if len(self.children) > 0 and all(c.terminal_value == -math.inf for c in self.children):
+            if len(self.children) > 0 and not self.untried and all(c.terminal_value == -math.inf for c in self.children):
+                stats and stats.proven(self.is_terminal)
                 self.terminal_value = math.inf
                 self.is_terminal = True
             else:
-                self.value.append(1)
+                self.add_value(1)
         elif winner is not None:
             if any(c.terminal_value == math.inf for c in self.children):
+                stats and stats.proven(self.is_terminal)
                 self.terminal_value = -math.inf
                 self.is_terminal = True
             else:
-                self.value.append(-1)
+                self.add_value(-1)
         else:
-            self.value.append(0)
+            self.add_value(0)
 
         if self.parent is not None:
-            self.parent.backpropagation(winner)
+            self.parent.backpropagation(winner, stats)
 
-    def backpropagation_with_minimax(self, winner, depth, is_previous_terminal=None):
+    def backpropagation_with_minimax(self, winner, depth, is_previous_terminal=None, table=None, stats=None,
+                                     max_nodes=None, proofs=None):
         self.visits += 1
         if winner != self.game.player_name():
             if any(c.terminal_value == -math.inf for c in self.children):
-                if all(c.terminal_value == -math.inf for c in self.children):
+                if not self.untried and all(c.terminal_value == -math.inf for c in self.children):
+                    stats and stats.proven(self.is_terminal)
                     self.terminal_value = math.inf
                     self.is_terminal = True
                 elif is_previous_terminal:
-                    if self.minimax(depth) is None:
-                        self.value.append(1)
+                    if self.minimax(depth, table, stats, max_nodes, proofs) is None:
+                        self.add_value(1)
                     else:
-                        self.value.append(1)
+                        self.add_value(1)
                 else:
-                    self.value.append(1)
+                    self.add_value(1)
             else:
-                self.value.append(1)
+                self.add_value(1)
         elif winner is not None:
             if any(c.terminal_value == math.inf for c in self.children):
+                stats and stats.proven(self.is_terminal)
                 self.terminal_value = -math.inf
                 self.is_terminal = True
             else:
-                self.value.append(-1)
+                self.add_value(-1)
         else:
-            self.value.append(0)
+            self.add_value(0)
 
         if self.parent is not None:
-            self.parent.backpropagation_with_minimax(winner, depth, self.is_terminal)
+            self.parent.backpropagation_with_minimax(winner, depth, self.is_terminal, table, stats, max_nodes,
+                                                     proofs)
+
+
+class Dag:
+    # Registry of the nodes of one transposition-aware search, by position_key(). A symmetric DAG also
+    # merges symmetric positions: a shared node keeps its own orientation and the parent's edge move.
+
+    def __init__(self, symmetric=False):
+        self.symmetric = symmetric
+        self.nodes = {}
+        self.root = None
+        self.iteration = 0
+        self.size = 0
+
+
+class DagNode(Node):
+    # Node whose children are shared between every parent reaching the same position. Values live on the
+    # shared nodes, visits per edge on the parent (edge_visits, aligned with children) for the UCB term.
+    # parent and edge are the parent and its child index on the path of the current iteration, and stamp
+    # marks the nodes on that path so cycles are never entered. A shared child's own move is the one of the
+    # parent that created it, child_moves has this node's.
+
+    def __init__(self, game, dag, move=None, parent=None):
+        super().__init__(game, move, parent)
+        self.dag = dag
+        self.edge = 0
+        self.edge_visits = self.child_moves = ()  # lists once expanded, most nodes stay leaves
+        self.stamp = 0
+        dag.size += 1
+
+    def child_weight(self, k, c):
+        visits = self.edge_visits[k]
+        if visits == 0:
+            return math.inf
 
+        child = self.children[k]
+        if child.is_terminal:
+            return child.terminal_value
 
-def mcts(game, duration=1, c=1.3, *args, **kwargs):
-    start = time.time()
-    root = Node(game)
+        ucb = math.log(self.visits / visits)
+        std = math.sqrt(child.m2 / (child.count - 1)) if child.count > 1 else 0
+        return child.mean + c * math.sqrt(ucb * min(1/4, std + 2*ucb))
+
+    def best_move(self, c):
+        return self.child_moves[max(range(len(self.children)), key=lambda k: self.child_weight(k, c))]
+
+    def subtree_size(self):
+        return self.dag.size
+
+    def selectable(self):
+        if self is self.dag.root:
+            self.dag.iteration += 1
+            self.stamp = self.dag.iteration
+        return [k for k, child in enumerate(self.children)
+                if not child.is_terminal and child.stamp != self.dag.iteration]
+
+    def non_terminal_children(self):
+        return [self.children[k] for k in self.selectable()]
+
+    def descend(self, k):
+        child = self.children[k]
+        child.parent = self
+        child.edge = k
+        child.stamp = self.dag.iteration
+        return child
 
-    while time.time()-start < duration:
+    def select(self, c):
+        return self.descend(max(self.selectable(), key=lambda k: self.child_weight(k, c)))
+
+    def expand(self):
+        dag = self.dag
+        if len(self.children) == 0:
+            self.edge_visits, self.child_moves = [], []
+            for move in self.game.moves():
+                child_game = self.game.copy()
+                child_game.play(move)
+                key = position_key(child_game, dag.symmetric)[0]
+                child = dag.nodes.get(key)
+                # A position already on the current path gets a private node, merging it would close a cycle
+                if child is None or child.stamp == dag.iteration:
+                    child = DagNode(child_game, dag, move)
+                    dag.nodes.setdefault(key, child)
+                # Moves reaching the same position (duplicate drops) share one edge
+                if all(child is not other for other in self.children):
+                    self.children.append(child)
+                    self.child_moves.append(move)
+                    self.edge_visits.append(0)
+
+        # Children already on the current path are ancestors, descending into one would close a cycle. With
+        # none left the node itself is played out.
+        open_children = [k for k, child in enumerate(self.children) if child.stamp != dag.iteration]
+        if len(open_children) == 0:
+            return self
+
+        return self.descend(random.choice(open_children))
+
+    def backpropagation(self, winner, stats=None):
+        if self.parent is not None:
+            self.parent.edge_visits[self.edge] += 1
+        super().backpropagation(winner, stats)
+
+    def backpropagation_with_minimax(self, winner, depth, is_previous_terminal=None, table=None, stats=None,
+                                     max_nodes=None, proofs=None):
+        if self.parent is not None:
+            self.parent.edge_visits[self.edge] += 1
+        super().backpropagation_with_minimax(winner, depth, is_previous_terminal, table, stats, max_nodes, proofs)
+
+
+def new_root(game, tree='node', symmetric=False):
+    if tree == 'array':
+        return ArrayTree(game).root()
+    elif tree == 'node':
+        return Node(game)
+    elif tree == 'dag':
+        dag = Dag(symmetric)
+        dag.root = dag.nodes[position_key(game, symmetric)[0]] = DagNode(game, dag)
+        return dag.root
+    raise Exception(f"No implementation for tree {tree}")
+
+
+def searching(start, duration, iteration, iterations=None, stop=None):
+    # A fixed iteration budget replaces the time limit, for machine-independent benchmarks.
+    # stop() is polled after the first iteration, and a timed search runs at least that one, so a stopped or
+    # out of time search still has a move to return.
+    if stop is not None and iteration > 0 and stop():
+        return False
+    if iterations is not None:
+        return iteration < iterations
+    return iteration == 0 or time.time()-start < duration
+
+
+def mcts(game, duration=1, c=1.3, *args, root=None, tree='node', playouts=1, iterations=None, stats=None, stop=None, solver=None, rollout=None, symmetric=False, **kwargs):
+    start = time.time()
+    if solver is not None and solver.applies(game):
+        return solver.solve(game)[1]
+    rollout = rollout_policy(rollout)
+    if root is None:
+        root = new_root(game, tree, symmetric)
+
+    iteration = 0
+    while searching(start, duration, iteration, iterations, stop):
+        iteration += 1
+        tick = stats and stats.clock()
         node = root
-        while len(node.non_terminal_children()) > 0:
+        depth = 0
+        while not node.is_leaf():
             node = node.select(c)
+            depth += 1
+        tick = stats and stats.lap('select', tick)
 
         node = node.expand()
-        node.backpropagation(node.simulate())
+        stats and stats.descended(depth + (node is not root))
+        tick = stats and stats.lap('expand', tick)
+        if playouts > 1:
+            winners = node.simulate_batch(playouts, stats, solver, rollout)
+            tick = stats and stats.lap('simulate', tick)
+            for winner in winners:
+                node.backpropagation(winner, stats)
+        else:
+            winner = node.simulate(stats, solver, rollout)
+            tick = stats and stats.lap('simulate', tick)
+            node.backpropagation(winner, stats)
+        stats and stats.lap('backpropagation', tick)
 
+    stats and stats.finished(root, start)
     return root.best_move(c)
 
 
-def mcts_mr(game, depth=2, duration=1, c=1.3, *args, **kwargs):
+def mcts_mr(game, depth=2, duration=1, c=1.3, *args, root=None, table=None, tree='node', iterations=None, stats=None, minimax_nodes=None, proofs=None, stop=None, solver=None, rollout=None, symmetric=False, **kwargs):
     start = time.time()
-    root = Node(game)
-
-    while time.time()-start < duration:
+    if solver is not None and solver.applies(game):
+        return solver.solve(game)[1]
+    rollout = rollout_policy(rollout)
+    if root is None:
+        root = new_root(game, tree, symmetric)
+    if table is None:
+        table = TranspositionTable(symmetric=symmetric)
+
+    iteration = 0
+    while searching(start, duration, iteration, iterations, stop):
+        iteration += 1
+        tick = stats and stats.clock()
         node = root
-        while len(node.non_terminal_children()) > 0:
+        tree_depth = 0
+        while not node.is_leaf():
             node = node.select(c)
+            tree_depth += 1
+        tick = stats and stats.lap('select', tick)
 
         node = node.expand()
-        winner = node.minimax(depth)
-        if winner is not None:
-            node.backpropagation(winner)
-        else:
-            node.backpropagation(node.simulate())
-
+        stats and stats.descended(tree_depth + (node is not root))
+        tick = stats and stats.lap('expand', tick)
+        winner = node.minimax(depth, table, stats, minimax_nodes, proofs)
+        if winner is None:
+            winner = node.simulate(stats, solver, rollout)
+            tick = stats and stats.lap('simulate', tick)
+        node.backpropagation(winner, stats)
+        stats and stats.lap('backpropagation', tick)
+
+    stats and stats.finished(root, start)
     return root.best_move(c)
 
 
-def mcts_ms(game, depth=2, visits=100, duration=1, c=1.3, *args, **kwargs):
+def mcts_ms(game, depth=2, visits=100, duration=1, c=1.3, *args, root=None, table=None, tree='node', iterations=None, stats=None, minimax_nodes=None, proofs=None, stop=None, solver=None, rollout=None, symmetric=False, **kwargs):
     start = time.time()
-    root = Node(game)
-
-    while time.time()-start < duration:
+    if solver is not None and solver.applies(game):
+        return solver.solve(game)[1]
+    rollout = rollout_policy(rollout)
+    if root is None:
+        root = new_root(game, tree, symmetric)
+    if table is None:
+        table = TranspositionTable(symmetric=symmetric)
+
+    iteration = 0
+    while searching(start, duration, iteration, iterations, stop):
+        iteration += 1
+        tick = stats and stats.clock()
         node = root
-        while len(node.non_terminal_children()) > 0:
+        tree_depth = 0
+        while not node.is_leaf():
             node = node.select(c)
+            tree_depth += 1
             if node.visits == visits:
                 break
+        tick = stats and stats.lap('select', tick)
 
         if node.visits == visits:
-            winner = node.minimax(depth)
+            winner = node.minimax(depth, table, stats, minimax_nodes, proofs)
             if winner is not None:
-                node.backpropagation(winner)
+                stats and stats.descended(tree_depth)
+                node.backpropagation(winner, stats)
+                stats and stats.lap('backpropagation', tick)
                 continue
 
         node = node.expand()
-        node.backpropagation(node.simulate())
-
+        stats and stats.descended(tree_depth + (node is not root))
+        tick = stats and stats.lap('expand', tick)
+        winner = node.simulate(stats, solver, rollout)
+        tick = stats and stats.lap('simulate', tick)
+        node.backpropagation(winner, stats)
+        stats and stats.lap('backpropagation', tick)
+
+    stats and stats.finished(root, start)
     return root.best_move(c)
 
 
-def mcts_mb(game, depth=2, duration=1, c=1.3, *args, **kwargs):
+def mcts_mb(game, depth=2, duration=1, c=1.3, *args, root=None, table=None, tree='node', iterations=None, stats=None, minimax_nodes=None, proofs=None, stop=None, solver=None, rollout=None, symmetric=False, **kwargs):
     start = time.time()
-    root = Node(game)
-
-    while time.time()-start < duration:
+    if solver is not None and solver.applies(game):
+        return solver.solve(game)[1]
+    rollout = rollout_policy(rollout)
+    if root is None:
+        root = new_root(game, tree, symmetric)
+    if table is None:
+        table = TranspositionTable(symmetric=symmetric)
+
+    iteration = 0
+    while searching(start, duration, iteration, iterations, stop):
+        iteration += 1
+        tick = stats and stats.clock()
         node = root
-        while len(node.non_terminal_children()) > 0:
+        tree_depth = 0
+        while not node.is_leaf():
             node = node.select(c)
+            tree_depth += 1
+        tick = stats and stats.lap('select', tick)
 
         node = node.expand()
-        node.backpropagation_with_minimax(node.simulate(), depth)
-
+        stats and stats.descended(tree_depth + (node is not root))
+        tick = stats and stats.lap('expand', tick)
+        winner = node.simulate(stats, solver, rollout)
+        tick = stats and stats.lap('simulate', tick)
+        node.backpropagation_with_minimax(winner, depth, table=table, stats=stats, max_nodes=minimax_nodes,
+                                          proofs=proofs)
+        stats and stats.lap('backpropagation', tick)
+
+    stats and stats.finished(root, start)
     return root.best_move(c)
+
+
+SEARCHES = {'mcts': mcts, 'mcts-mr': mcts_mr, 'mcts-ms': mcts_ms, 'mcts-mb': mcts_mb}
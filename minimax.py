@@ -1,43 +1,273 @@
+from collections import OrderedDict
 import math
+import time
 
 INF = math.inf
+EXACT, LOWER, UPPER = 0, 1, 2
 
 
-def minimax(game, depth):
+def position_key(game, symmetric=False):
+    # The Zobrist hash and symmetry 0, or for a symmetric table and a game with canonical(), the hash of the
+    # canonical orientation and the symmetry taking the game there. Symmetric positions then share entries.
+    if symmetric and hasattr(game, 'canonical'):
+        return game.canonical()
+    return game.zobrist, 0
+
+
+class TranspositionTable:
+    # Moves are stored in the canonical orientation when the table is symmetric
+
+    def __init__(self, size=2**16, symmetric=False):
+        self.size = size
+        self.symmetric = symmetric
+        self.entries = [None] * size
+        self.probes = 0
+        self.hits = 0
+
+    def lookup(self, key):
+        self.probes += 1
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+
+    def store(self, key, depth, value, bound, move):
+        # Depth-preferred replacement: a shallower result never evicts a deeper one of another position
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or depth >= entry[1]:
+            self.entries[index] = (key, depth, value, bound, move)
+
+
+class ProofCache:
+    # Bounded LRU of minimax results by position_key(). A proven value (from the side to move's point of view)
+    # holds at every depth, an unproven one only answers searches no deeper than the one that produced it.
+
+    def __init__(self, size=2**16, symmetric=False):
+        self.size = size
+        self.symmetric = symmetric
+        self.entries = OrderedDict()
+        self.probes = 0
+        self.hits = 0
+
+    def lookup(self, key, depth):
+        self.probes += 1
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, searched_depth = entry
+            if value != 0 or searched_depth >= depth:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return value
+
+    def store(self, key, depth, value):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == 0 and value == 0:
+            depth = max(depth, entry[1])
+        self.entries[key] = (value, depth)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class MoveOrdering:
+    # Killer moves per ply and history scores per move, kept across the iterations of a deepening search
+
+    def __init__(self):
+        self.killers = {}
+        self.history = {}
+
+    def order(self, game, moves, best_move, ply):
+        killers = self.killers.get(ply, ())
+        is_capture = getattr(game, 'is_capture', None)
+
+        def score(move):
+            return (move == best_move, move in killers, is_capture is not None and is_capture(move),
+                    self.history.get(move, 0))
+        return sorted(moves, key=score, reverse=True)
+
+    def cutoff(self, move, depth, ply):
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[move] = self.history.get(move, 0) + depth * depth
+
+
+def search(game, depth, table=None, ordering=None, first_move=None, deadline=None, max_nodes=math.inf):
+    # Returns the value, the best root move, the node count and whether the depth limit cut any line.
+    # Raises SearchTimeout once the deadline or the node budget is passed.
+    nodes = 0
+    depth_limited = False
+    root_move = None
+    player, opponent = game.player_name(), game.opposite_player()
+
     def evaluate_board(inner_game):
         winner = inner_game.winner()
-        if winner == game.player_name():
+        if winner == player:
             return INF
-        elif winner == game.opposite_player():
+        elif winner == opponent:
             return -INF
         return 0
 
-    def minimax_alpha_beta(game, depth, alpha=-math.inf, beta=math.inf, maximizing_player=True):
+    def ordered_moves(game, best_move, ply):
+        moves = game.moves()
+        if ordering is not None:
+            return ordering.order(game, moves, best_move, ply)
+        if best_move is None:
+            return moves
+        return [best_move] + [move for move in moves if move != best_move]
+
+    def minimax_alpha_beta(game, depth, alpha=-math.inf, beta=math.inf, maximizing_player=True, ply=0):
+        nonlocal nodes, depth_limited, root_move
+        nodes += 1
+        if nodes > max_nodes or (deadline is not None and nodes & 255 == 0 and time.time() > deadline):
+            raise SearchTimeout(nodes)
 
-        if depth == 0 or game.winner():
+        if game.winner():
             return evaluate_board(game)
+        if depth == 0:
+            depth_limited = True
+            return evaluate_board(game)
+
+        # Entries are stored from the side to move's point of view, so minimizing nodes negate them
+        sign = 1 if maximizing_player else -1
+        best_move = first_move if ply == 0 else None
+        if table is not None:
+            key, symmetry = position_key(game, table.symmetric)
+            entry = table.lookup(key)
+            if entry is not None:
+                _, entry_depth, value, bound, best_move = entry
+                if symmetry and best_move is not None:
+                    best_move = game.real_move(best_move, symmetry)
+                if ply == 0:
+                    root_move = best_move
+                if entry_depth >= depth:
+                    # The stored search may have been cut by its own depth limit
+                    depth_limited = True
+                    value *= sign
+                    if bound != EXACT and not maximizing_player:
+                        bound = UPPER if bound == LOWER else LOWER
+                    if bound == EXACT:
+                        return value
+                    if bound == LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if beta <= alpha:
+                        return value
+        original_alpha, original_beta = alpha, beta
 
         if maximizing_player:
             max_eval = -INF
-            for move in game.moves():
-                game_copy = game.copy()
-                game_copy.play(move)
-                eval = minimax_alpha_beta(game_copy, depth - 1, alpha, beta, False)
+            for move in ordered_moves(game, best_move, ply):
+                token = game.play(move)
+                eval = minimax_alpha_beta(game, depth - 1, alpha, beta, False, ply + 1)
+                game.undo(token)
+                if eval > max_eval or best_move is None:
+                    best_move = move
                 max_eval = max(max_eval, eval)
                 alpha = max(alpha, eval)
                 if beta <= alpha:
+                    if ordering is not None:
+                        ordering.cutoff(move, depth, ply)
                     break  # Beta cut-off
-            return max_eval
+            result = max_eval
         else:
             min_eval = INF
-            for move in game.moves():
-                game_copy = game.copy()
-                game_copy.play(move)
-                eval = minimax_alpha_beta(game_copy, depth - 1, alpha, beta, True)
+            for move in ordered_moves(game, best_move, ply):
+                token = game.play(move)
+                eval = minimax_alpha_beta(game, depth - 1, alpha, beta, True, ply + 1)
+                game.undo(token)
+                if eval < min_eval or best_move is None:
+                    best_move = move
                 min_eval = min(min_eval, eval)
                 beta = min(beta, eval)
                 if beta <= alpha:
+                    if ordering is not None:
+                        ordering.cutoff(move, depth, ply)
                     break  # Alpha cut-off
-            return min_eval
+            result = min_eval
+
+        if ply == 0:
+            root_move = best_move
+        if table is not None:
+            if result <= original_alpha:
+                bound = UPPER if maximizing_player else LOWER
+            elif result >= original_beta:
+                bound = LOWER if maximizing_player else UPPER
+            else:
+                bound = EXACT
+            table.store(key, depth, result * sign, bound,
+                        game.canonical_move(best_move, symmetry) if symmetry and best_move is not None else best_move)
+        return result
+
+    # Children are searched with play/undo on one scratch state instead of a copy per node
+    result = minimax_alpha_beta(game.copy(), depth)
+    return result, root_move, nodes, depth_limited
+
+
+def minimax(game, depth, table=None, stats=None, ordering=None, max_nodes=None):
+    # A search that runs out of max_nodes proves nothing and returns 0
+    try:
+        result, _, nodes, _ = search(game, depth, table, ordering, max_nodes=max_nodes or math.inf)
+    except SearchTimeout as timeout:
+        result, nodes = 0, timeout.args[0]
+    if stats is not None:
+        stats['nodes'] = stats.get('nodes', 0) + nodes
+    return result
+
+
+def iterative_deepening(game, max_depth=64, duration=None, max_nodes=None, table=None, stats=None, ordering=True,
+                        symmetric=False, depth=None, **kwargs):
+    # Searches depth 1, 2, ... until the time or node budget runs out, and answers with the last completed
+    # depth. Each iteration starts from the previous best move, the table and the killer/history tables.
+    # depth is max_depth under the name the other searches use, and like them it ignores the other
+    # searches' parameters (c, rollout, tree, ...) so one player configuration fits every search.
+    if depth is not None:
+        max_depth = depth
+    deadline = None if duration is None else time.time() + duration
+    if table is None:
+        table = TranspositionTable(symmetric=symmetric)
+    ordering = MoveOrdering() if ordering is True else ordering or None
+    value, move, completed = 0, None, 0
+    used = 0
+    for depth in range(1, max_depth + 1):
+        budget = math.inf if max_nodes is None else max_nodes - used
+        try:
+            value, move, nodes, depth_limited = search(game, depth, table, ordering, move, deadline, budget)
+        except SearchTimeout as timeout:
+            used += timeout.args[0]
+            break
+        used += nodes
+        completed = depth
+        # A proven result or a tree searched to the end won't change with more depth
+        if value != 0 or not depth_limited:
+            break
+    if stats is not None:
+        stats['nodes'] = stats.get('nodes', 0) + used
+        stats['depth'] = completed
+    if move is None and len(game.moves()) > 0:
+        move = game.moves()[0]
+    return value, move
+
 
-    return minimax_alpha_beta(game, depth)
\ No newline at end of file
+def prove(game, depth, table=None, stats=None, max_nodes=None, proofs=None):
+    # minimax behind the proof cache, timed by SearchStats when given
+    if proofs is not None:
+        key = position_key(game, proofs.symmetric)[0]
+        result = proofs.lookup(key, depth)
+        if result is not None:
+            return result
+    if stats:
+        result = stats.minimax(game, depth, table, max_nodes)
+    else:
+        result = minimax(game, depth, table, max_nodes=max_nodes)
+    # With a node budget a 0 may only mean the budget ran out, so only proofs are kept
+    if proofs is not None and (result != 0 or max_nodes is None):
+        proofs.store(key, depth, result)
+    return result
@@ -1,14 +1,20 @@
-from functools import lru_cache
+from zobrist import UNKNOWN
 import numpy as np
+import zobrist
+
+
+# ZOBRIST[square][player < 0], shared by both Othello representations
+ZOBRIST = zobrist.table(64, 2)
 
 
 class Othello:
+    __slots__ = ('player', 'board', 'zobrist', '_moves', '_winner')
     SIZE = 8
     EMPTY = 0
     BLACK = 1
     WHITE = -1
 
-    def __init__(self, player=BLACK, board=None):
+    def __init__(self, player=BLACK, board=None, zobrist=None):
         self.player = player
         if board is None:
             self.board = np.zeros((Othello.SIZE, Othello.SIZE), dtype=np.int8)
@@ -18,19 +24,39 @@ class Othello:
             self.board[c1, c2] = self.board[c2, c1] = Othello.WHITE
         else:
             self.board = board
+        self.zobrist = self.compute_zobrist() if zobrist is None else zobrist
+        self._moves = None
+        self._winner = UNKNOWN
 
     def copy(self):
-        return Othello(self.player, self.board.copy())
+        return Othello(self.player, self.board.copy(), self.zobrist)
+
+    def compute_zobrist(self):
+        h = zobrist.SIDE if self.player == Othello.WHITE else 0
+        for row, col in zip(*np.nonzero(self.board)):
+            h ^= ZOBRIST[row * Othello.SIZE + col][int(self.board[row, col] < 0)]
+        return h
+
+    def key(self):
+        return self.player, self.board.tobytes()
+
+    def canonical(self):
+        black, white = (int.from_bytes(np.packbits(self.board == color, bitorder='little').tobytes(), 'little')
+                        for color in (Othello.BLACK, Othello.WHITE))
+        return canonical(self.player, black, white)
+
+    def canonical_move(self, move, symmetry):
+        return row_col(SYMMETRY_SQUARES[symmetry][square(*move)])
+
+    def real_move(self, move, symmetry):
+        return row_col(INVERSE_SQUARES[symmetry][square(*move)])
 
     def clear_cache(self):
-        self.moves.cache_clear()
-        self.player_name.cache_clear()
-        self.opposite_player.cache_clear()
-        self.winner.cache_clear()
-        self.is_valid_move.cache_clear()
-        self.__str__.cache_clear()
+        self._moves = None
+        self._winner = UNKNOWN
 
     def play(self, move):
+        token = (move, [], self.zobrist, self._moves, self._winner)
         row, col = move[0], move[1]
         self.board[row, col] = self.player
         opponent = -self.player
@@ -44,10 +70,20 @@ class Othello:
             if len(pieces_to_flip) > 0 and 0 <= r < Othello.SIZE and 0 <= c < Othello.SIZE and self.board[r, c] == self.player:
                 for rr, cc in pieces_to_flip:
                     self.board[rr, cc] = self.player
+                    self.zobrist ^= ZOBRIST[rr * Othello.SIZE + cc][0] ^ ZOBRIST[rr * Othello.SIZE + cc][1]
+                token[1].extend(pieces_to_flip)
+        self.zobrist ^= ZOBRIST[row * Othello.SIZE + col][self.player < 0] ^ zobrist.SIDE
         self.player = opponent
         self.clear_cache()
+        return token
+
+    def undo(self, token):
+        (row, col), flipped, self.zobrist, self._moves, self._winner = token
+        self.player = -self.player
+        self.board[row, col] = Othello.EMPTY
+        for r, c in flipped:
+            self.board[r, c] = -self.player
 
-    @lru_cache(maxsize=None)
     def is_valid_move(self, row, col):
         if self.board[row, col] != 0:
             return False
@@ -65,39 +101,264 @@ class Othello:
                 break
         return valid
 
-    @lru_cache(maxsize=None)
     def moves(self):
-        moves = []
-        for r in range(8):
-            for c in range(8):
-                if self.is_valid_move(r, c):
-                    moves.append((r, c))
-        return moves
-
-    @lru_cache(maxsize=None)
+        if self._moves is None:
+            self._moves = [(r, c) for r in range(8) for c in range(8) if self.is_valid_move(r, c)]
+        return self._moves
+
+    def empties(self):
+        return int(np.count_nonzero(self.board == Othello.EMPTY))
+
     def player_name(self):
         if self.player==1: return 'X'
         else: return 'O'
 
-    @lru_cache(maxsize=None)
     def opposite_player(self):
         if self.player==-1: return 'X'
         else: return 'O'
 
-    @lru_cache(maxsize=None)
+    def winner(self):
+        if self._winner is UNKNOWN:
+            self._winner = None
+            if len(self.moves()) == 0:
+                black = np.count_nonzero(self.board == 1)
+                white = np.count_nonzero(self.board == -1)
+                if black > white:
+                    self._winner = 'X'
+                elif black < white:
+                    self._winner = 'O'
+        return self._winner
+
+    def __str__(self):
+        result = ''
+        for i, col in enumerate(self.board):
+            result += f'{Othello.SIZE-i} | {" | ".join(col.astype(str)).replace("0", " ").replace("-1", "O").replace("1", "X")}\n'
+        result += f'  | {" | ".join((np.arange(Othello.SIZE  )+1).astype(str))}\n'
+        return result
+
+
+FULL = (1 << 64) - 1
+NOT_FIRST_COL = FULL & ~0x0101010101010101
+NOT_LAST_COL = FULL & ~0x8080808080808080
+# (shift, mask) pairs for the eight directions, bit index = row * 8 + col
+DIRECTIONS = ((1, NOT_FIRST_COL), (-1, NOT_LAST_COL), (8, FULL), (-8, FULL),
+              (9, NOT_FIRST_COL), (7, NOT_LAST_COL), (-7, NOT_FIRST_COL), (-9, NOT_LAST_COL))
+
+
+def shift(bits, direction, mask):
+    if direction > 0:
+        return (bits << direction) & mask
+    return (bits >> -direction) & mask
+
+
+def square(row, col):
+    return row * Othello.SIZE + col
+
+
+def row_col(sq):
+    return divmod(sq, Othello.SIZE)
+
+
+def flip_rows(bits):
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+def mirror_cols(bits):
+    bits = ((bits >> 1) & 0x5555555555555555) | ((bits & 0x5555555555555555) << 1)
+    bits = ((bits >> 2) & 0x3333333333333333) | ((bits & 0x3333333333333333) << 2)
+    return ((bits >> 4) & 0x0f0f0f0f0f0f0f0f) | ((bits & 0x0f0f0f0f0f0f0f0f) << 4)
+
+
+def transpose(bits):
+    # Delta swaps across the main diagonal, square(row, col) goes to square(col, row)
+    for step, mask in ((28, 0x0f0f0f0f00000000), (14, 0x3333000033330000), (7, 0x5500550055005500)):
+        t = mask & (bits ^ (bits << step))
+        bits ^= t ^ (t >> step)
+    return bits
+
+
+def transform(bits, symmetry):
+    # The eight board symmetries: bit 2 transposes, then bit 1 flips the rows, then bit 0 mirrors the columns
+    if symmetry & 4:
+        bits = transpose(bits)
+    if symmetry & 2:
+        bits = flip_rows(bits)
+    if symmetry & 1:
+        bits = mirror_cols(bits)
+    return bits
+
+
+# SYMMETRY_SQUARES[symmetry][sq] is where sq lands, INVERSE_SQUARES[symmetry] maps it back
+SYMMETRY_SQUARES = [[transform(1 << sq, symmetry).bit_length() - 1 for sq in range(64)] for symmetry in range(8)]
+INVERSE_SQUARES = [[squares.index(sq) for sq in range(64)] for squares in SYMMETRY_SQUARES]
+
+
+def orientations(bits):
+    # bits under each of the eight symmetries, in the order of transform()
+    result = []
+    for bits in (bits, transpose(bits)):
+        mirrored = mirror_cols(bits)
+        result += [bits, mirrored, flip_rows(bits), flip_rows(mirrored)]
+    return result
+
+
+def bitboard_zobrist(player, black, white):
+    h = zobrist.SIDE if player == Othello.WHITE else 0
+    for color, bits in enumerate((black, white)):
+        while bits:
+            low = bits & -bits
+            h ^= ZOBRIST[low.bit_length() - 1][color]
+            bits ^= low
+    return h
+
+
+def canonical(player, black, white):
+    # Zobrist hash of the smallest of the eight orientations and the symmetry producing it. The hash is the
+    # one the canonical orientation has as a game, so it is stable across runs and matches key() there.
+    blacks, whites = orientations(black), orientations(white)
+    symmetry = min(range(8), key=lambda symmetry: (blacks[symmetry], whites[symmetry]))
+    return bitboard_zobrist(player, blacks[symmetry], whites[symmetry]), symmetry
+
+
+class BitboardOthello:
+    __slots__ = ('player', 'black', 'white', 'zobrist', '_moves')
+    SIZE = 8
+    BLACK = 1
+    WHITE = -1
+
+    def __init__(self, player=BLACK, black=None, white=None, zobrist=None):
+        self.player = player
+        if black is None:
+            self.black = (1 << square(3, 3)) | (1 << square(4, 4))
+            self.white = (1 << square(3, 4)) | (1 << square(4, 3))
+        else:
+            self.black = black
+            self.white = white
+        self.zobrist = self.compute_zobrist() if zobrist is None else zobrist
+        self._moves = None
+
+    @classmethod
+    def from_othello(cls, game):
+        black = white = 0
+        for row in range(Othello.SIZE):
+            for col in range(Othello.SIZE):
+                if game.board[row, col] == Othello.BLACK:
+                    black |= 1 << square(row, col)
+                elif game.board[row, col] == Othello.WHITE:
+                    white |= 1 << square(row, col)
+        return cls(game.player, black, white)
+
+    def copy(self):
+        return BitboardOthello(self.player, self.black, self.white, self.zobrist)
+
+    def compute_zobrist(self):
+        return bitboard_zobrist(self.player, self.black, self.white)
+
+    def key(self):
+        return self.player, self.black, self.white
+
+    def canonical(self):
+        return canonical(self.player, self.black, self.white)
+
+    def canonical_move(self, move, symmetry):
+        return SYMMETRY_SQUARES[symmetry][move]
+
+    def real_move(self, move, symmetry):
+        return INVERSE_SQUARES[symmetry][move]
+
+    def own_opponent(self):
+        if self.player == BitboardOthello.BLACK:
+            return self.black, self.white
+        return self.white, self.black
+
+    def legal_mask(self):
+        own, opponent = self.own_opponent()
+        empty = FULL & ~(own | opponent)
+        legal = 0
+        for direction, mask in DIRECTIONS:
+            x = shift(own, direction, mask) & opponent
+            for _ in range(5):
+                x |= shift(x, direction, mask) & opponent
+            legal |= shift(x, direction, mask) & empty
+        return legal
+
+    def flips(self, sq):
+        own, opponent = self.own_opponent()
+        flips = 0
+        for direction, mask in DIRECTIONS:
+            captured = 0
+            x = shift(1 << sq, direction, mask)
+            while x & opponent:
+                captured |= x
+                x = shift(x, direction, mask)
+            if x & own:
+                flips |= captured
+        return flips
+
+    def play(self, move):
+        token = (self.black, self.white, self.zobrist, self._moves)
+        flips = self.flips(move)
+        h = self.zobrist ^ ZOBRIST[move][self.player < 0] ^ zobrist.SIDE
+        x = flips
+        while x:
+            lowest = x & -x
+            sq = lowest.bit_length() - 1
+            h ^= ZOBRIST[sq][0] ^ ZOBRIST[sq][1]
+            x ^= lowest
+        flips |= 1 << move
+        if self.player == BitboardOthello.BLACK:
+            self.black |= flips
+            self.white &= ~flips
+        else:
+            self.white |= flips
+            self.black &= ~flips
+        self.zobrist = h
+        self.player = -self.player
+        self._moves = None
+        return token
+
+    def undo(self, token):
+        self.black, self.white, self.zobrist, self._moves = token
+        self.player = -self.player
+
+    def moves(self):
+        if self._moves is None:
+            legal = self.legal_mask()
+            moves = []
+            while legal:
+                lowest = legal & -legal
+                moves.append(lowest.bit_length() - 1)
+                legal ^= lowest
+            self._moves = moves
+        return self._moves
+
+    def empties(self):
+        return 64 - (self.black | self.white).bit_count()
+
+    def player_name(self):
+        if self.player == 1: return 'X'
+        else: return 'O'
+
+    def opposite_player(self):
+        if self.player == -1: return 'X'
+        else: return 'O'
+
     def winner(self):
         if len(self.moves()) == 0:
-            black = np.count_nonzero(self.board == 1)
-            white = np.count_nonzero(self.board == -1)
+            black = self.black.bit_count()
+            white = self.white.bit_count()
             if black > white:
                 return 'X'
             elif black < white:
                 return 'O'
 
-    @lru_cache(maxsize=None)
     def __str__(self):
         result = ''
-        for i, col in enumerate(self.board):
-            result += f'{Othello.SIZE-i} | {" | ".join(col.astype(str)).replace("0", " ").replace("-1", "O").replace("1", "X")}\n'
-        result += f'  | {" | ".join((np.arange(Othello.SIZE  )+1).astype(str))}\n'
-        return result
\ No newline at end of file
+        for row in range(BitboardOthello.SIZE):
+            cells = []
+            for col in range(BitboardOthello.SIZE):
+                bit = 1 << square(row, col)
+                cells.append('X' if self.black & bit else 'O' if self.white & bit else ' ')
+            result += f'{BitboardOthello.SIZE-row} | {" | ".join(cells)}\n'
+        result += f'  | {" | ".join(str(i+1) for i in range(BitboardOthello.SIZE))}\n'
+        return result
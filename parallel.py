@@ -0,0 +1,135 @@
+from concurrent.futures import ProcessPoolExecutor
+from mcts import Node, SearchStats, SEARCHES
+from minimax import ProofCache
+from solver import Solver
+import inspect
+import random
+import time
+
+
+pools = {}
+
+
+def get_pool(workers):
+    # Pools are kept per process so repeated moves don't pay the worker start-up cost.
+    # Every worker reseeds from os.urandom, otherwise forked workers share one random state.
+    if workers not in pools:
+        pools[workers] = ProcessPoolExecutor(max_workers=workers, initializer=random.seed)
+    return pools[workers]
+
+
+def search_arguments(name, game, args, kwargs):
+    arguments = inspect.signature(SEARCHES[name]).bind(game, *args, **kwargs)
+    arguments.apply_defaults()
+    return arguments.arguments
+
+
+def search_root(name, game, seed, args, kwargs, solver_args=None):
+    # The worker's stats and proof cache start empty and travel back with the root statistics. Its solver
+    # is built here, so the caller's table isn't pickled on every move.
+    random.seed(seed)
+    if solver_args is not None:
+        kwargs = dict(kwargs, solver=Solver(*solver_args))
+    root = Node(game)
+    SEARCHES[name](game, *args, root=root, **kwargs)
+    children = [(child.move, child.visits, (child.count, child.mean, child.m2), child.is_terminal,
+                 child.terminal_value) for child in root.children]
+    return root.visits, children, kwargs.get('stats'), kwargs.get('proofs')
+
+
+def merge_roots(game, results):
+    root = Node(game)
+    children = {}
+    for visits, stats, *_ in results:
+        root.visits += visits
+        for move, visits, (count, mean, m2), is_terminal, terminal_value in stats:
+            if move not in children:
+                children[move] = Node(None, move, root)
+                root.children.append(children[move])
+            child = children[move]
+            child.visits += visits
+            # Chan et al. pairwise combination of the running statistics
+            total = child.count + count
+            if total > 0:
+                delta = mean - child.mean
+                child.m2 += m2 + delta * delta * child.count * count / total
+                child.mean += delta * count / total
+                child.count = total
+            # Terminal values are proven, so a single worker finding one is enough
+            if is_terminal:
+                child.is_terminal = True
+                child.terminal_value = terminal_value
+    return root
+
+
+def root_parallel(name, game, workers, *args, stats=None, proofs=None, solver=None, **kwargs):
+    pool = get_pool(workers)
+    if name == 'mcts':
+        proofs = None  # plain mcts runs no minimax, it would only ship the cache back and forth
+    solver_args = solver and (solver.empties, solver.table.size, solver.mobility_empties)
+    futures = [pool.submit(search_root, name, game, random.getrandbits(64), args,
+                           dict(kwargs, stats=stats and SearchStats(),
+                                proofs=proofs and ProofCache(proofs.size, proofs.symmetric)), solver_args)
+               for _ in range(workers)]
+    results = [future.result() for future in futures]
+    # Every worker's statistics count, and the proofs any of them found are kept for the next move
+    for _, _, worker_stats, worker_proofs in results:
+        stats and stats.merge(worker_stats)
+        if proofs is not None:
+            for key, (value, depth) in worker_proofs.entries.items():
+                proofs.store(key, depth, value)
+    return merge_roots(game, results)
+
+
+def playout(game):
+    simulation_game = game.copy()
+    while len(moves := simulation_game.moves()) > 0:
+        simulation_game.play(random.choice(moves))
+    return simulation_game.winner()
+
+
+def leaf_parallel(game, workers, duration=1, c=1.3, batch=None, root=None, stats=None):
+    pool = get_pool(workers)
+    batch = batch or workers
+    start = time.time()
+    if root is None:
+        root = Node(game)
+
+    while time.time()-start < duration:
+        node = root
+        depth = 0
+        while not node.is_leaf():
+            node = node.select(c)
+            depth += 1
+
+        node = node.expand()
+        stats and stats.descended(depth)
+        if winner := node.game.winner():
+            stats and stats.terminal_leaf()
+            node.declare_terminal(winner)
+            node.backpropagation(winner)
+            continue
+
+        stats and stats.simulated(batch)
+        for winner in pool.map(playout, [node.game] * batch):
+            node.backpropagation(winner)
+
+    stats and stats.finished(root, start)
+    return root
+
+
+def parallel_search(name, game, *args, workers=1, parallel='root', batch=None, stats=None, proofs=None,
+                    solver=None, **kwargs):
+    arguments = search_arguments(name, game, args, kwargs)
+    # A solvable root needs no workers, the same shortcut the sequential searches take
+    if solver is not None and solver.applies(game):
+        return solver.solve(game)[1]
+    if parallel == 'root':
+        root = root_parallel(name, game, workers, *args, stats=stats, proofs=proofs, solver=solver, **kwargs)
+    elif parallel == 'leaf':
+        if name != 'mcts':
+            raise Exception(f"Leaf parallelism is only implemented for mcts, not {name}")
+        root = leaf_parallel(game, workers, arguments['duration'], arguments['c'], batch, stats=stats)
+    else:
+        raise Exception(f"No implementation for parallel mode {parallel}")
+    return root.best_move(arguments['c'])
@@ -0,0 +1,308 @@
+from othello import Othello, BitboardOthello, DIRECTIONS, square
+from catchTheLion import CatchTheLion, EncodedCatchTheLion, hand_shift
+from connect4 import Connect4
+import numpy as np
+import random
+
+
+def generator():
+    # Seeded from the random module so random.seed() also fixes batched playouts
+    return np.random.default_rng(random.getrandbits(64))
+
+
+def random_squares(legal, rng):
+    # Uniform choice of one legal entry per row: the largest random key among the legal ones wins
+    keys = rng.random(legal.shape)
+    keys[~legal] = -1
+    return keys.argmax(axis=1)
+
+
+def connect4_wins(boards, cols, rows, players):
+    n = len(cols)
+    games = np.arange(n)
+    wins = np.zeros(n, dtype=bool)
+    for dc, dr in ((1, 0), (0, 1), (1, 1), (1, -1)):
+        count = np.ones(n, dtype=np.int8)
+        for sign in (1, -1):
+            run = np.ones(n, dtype=bool)
+            for step in range(1, 4):
+                c, r = cols + sign * step * dc, rows + sign * step * dr
+                inside = (c >= 0) & (c < Connect4.COLS) & (r >= 0) & (r < Connect4.ROWS)
+                cells = np.zeros(n, dtype=boards.dtype)
+                cells[inside] = boards[games[inside], c[inside], r[inside]]
+                run &= inside & (cells == players)
+                count += run
+        wins |= count >= 4
+    return wins
+
+
+def connect4_playouts(game, playouts, rng=None):
+    if winner := game.winner():
+        return [winner] * playouts
+    rng = rng or generator()
+    boards = np.repeat(game.board[None].astype(np.int8), playouts, axis=0)
+    heights = np.count_nonzero(boards, axis=2)
+    players = np.full(playouts, game.player, dtype=np.int8)
+    winners = np.zeros(playouts, dtype=np.int8)
+    active = np.arange(playouts)
+
+    while len(active) > 0:
+        legal = heights[active] < Connect4.ROWS
+        active = active[legal.any(axis=1)]  # a full board is a draw
+        legal = legal[legal.any(axis=1)]
+        if len(active) == 0:
+            break
+        cols = random_squares(legal, rng)
+        rows = Connect4.ROWS - 1 - heights[active, cols]
+        boards[active, cols, rows] = players[active]
+        heights[active, cols] += 1
+        wins = connect4_wins(boards[active], cols, rows, players[active])
+        winners[active[wins]] = players[active[wins]]
+        players[active] = -players[active]
+        active = active[~wins]
+
+    return [None if w == 0 else 'X' if w == 1 else 'O' for w in winners.tolist()]
+
+
+MASKS = [(direction, np.uint64(mask)) for direction, mask in DIRECTIONS]
+SQUARES = np.arange(64, dtype=np.uint64)
+
+
+def shift(bits, direction, mask):
+    if direction > 0:
+        return (bits << np.uint64(direction)) & mask
+    return (bits >> np.uint64(-direction)) & mask
+
+
+def popcount(bits):
+    return np.unpackbits(bits.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+def othello_playouts(game, playouts, rng=None):
+    if isinstance(game, Othello):
+        game = BitboardOthello.from_othello(game)
+    rng = rng or generator()
+    own, opponent = (np.full(playouts, bits, dtype=np.uint64) for bits in game.own_opponent())
+    players = np.full(playouts, game.player, dtype=np.int8)
+    black = np.zeros(playouts, dtype=np.int64)
+    white = np.zeros(playouts, dtype=np.int64)
+    active = np.arange(playouts)
+
+    while len(active) > 0:
+        o, p = own[active], opponent[active]
+        empty = ~(o | p)
+        legal = np.zeros(len(active), dtype=np.uint64)
+        for direction, mask in MASKS:
+            x = shift(o, direction, mask) & p
+            for _ in range(5):
+                x |= shift(x, direction, mask) & p
+            legal |= shift(x, direction, mask) & empty
+
+        # The side to move without a legal move ends the game
+        finished = legal == 0
+        if finished.any():
+            done = active[finished]
+            own_count, opponent_count = popcount(own[done]), popcount(opponent[done])
+            is_black = players[done] == Othello.BLACK
+            black[done] = np.where(is_black, own_count, opponent_count)
+            white[done] = np.where(is_black, opponent_count, own_count)
+            active, o, p, legal = active[~finished], o[~finished], p[~finished], legal[~finished]
+            if len(active) == 0:
+                break
+
+        squares = random_squares(((legal[:, None] >> SQUARES) & np.uint64(1)).astype(bool), rng)
+        move = np.uint64(1) << squares.astype(np.uint64)
+        flips = np.zeros(len(active), dtype=np.uint64)
+        for direction, mask in MASKS:
+            captured = np.zeros(len(active), dtype=np.uint64)
+            x = shift(move, direction, mask)
+            alive = np.ones(len(active), dtype=bool)
+            for _ in range(7):
+                flips |= np.where(alive & ((x & o) != 0), captured, np.uint64(0))
+                alive &= (x & p) != 0
+                captured = np.where(alive, captured | x, captured)
+                x = shift(x, direction, mask)
+        own[active] = p & ~flips
+        opponent[active] = o | flips | move
+        players[active] = -players[active]
+
+    return [None if b == w else 'X' if b > w else 'O' for b, w in zip(black.tolist(), white.tolist())]
+
+
+BATCH_PLAYOUTS = {
+    Connect4: connect4_playouts,
+    Othello: othello_playouts,
+    BitboardOthello: othello_playouts,
+}
+
+
+def batch_playouts(game, playouts):
+    if type(game) in BATCH_PLAYOUTS:
+        return BATCH_PLAYOUTS[type(game)](game, playouts)
+    winners = []
+    for _ in range(playouts):
+        tokens = []
+        while len(moves := game.moves()) > 0:
+            tokens.append(game.play(random.choice(moves)))
+        winners.append(game.winner())
+        for token in reversed(tokens):
+            game.undo(token)
+    return winners
+
+
+# Leaf evaluation shared by the node types of mcts.py and arraytree.py. A node provides game, is_terminal,
+# declare_terminal() and declare_draw().
+
+def solve_leaf(node, solver, stats=None):
+    # Exact result of a small endgame. Wins and losses are declared like minimax proofs, a draw only
+    # ends the node, declare_terminal would count it as a win.
+    value, _ = solver.solve(node.game)
+    stats and stats.solved()
+    if value == 0:
+        node.declare_draw()
+        return None
+    winner = node.game.player_name() if value > 0 else node.game.opposite_player()
+    node.declare_terminal(winner)
+    return winner
+
+
+def simulate_leaf(node, stats=None, solver=None, rollout=None):
+    stats and stats.simulated(1)
+    game = node.game
+    if winner := game.winner():
+        stats and stats.terminal_leaf()
+        node.declare_terminal(winner)
+    if solver is not None and not node.is_terminal and solver.applies(game):
+        return solve_leaf(node, solver, stats)
+    if rollout is not None:
+        return rollout(game)
+
+    # Plays out on the node's own state and unwinds it afterwards instead of copying it
+    tokens = []
+    while len(moves := game.moves()) > 0:
+        tokens.append(game.play(random.choice(moves)))
+    winner = game.winner()
+    for token in reversed(tokens):
+        game.undo(token)
+    return winner
+
+
+def simulate_leaf_batch(node, playouts, stats=None, solver=None, rollout=None):
+    game = node.game
+    if winner := game.winner():
+        stats and stats.terminal_leaf()
+        node.declare_terminal(winner)
+        return [winner]
+    if solver is not None and not node.is_terminal and solver.applies(game):
+        return [solve_leaf(node, solver, stats)]
+    stats and stats.simulated(playouts)
+    if rollout is not None:
+        return [rollout(game) for _ in range(playouts)]
+    return batch_playouts(game, playouts)
+
+
+# Sampling weights of the Othello squares: corners first, the squares that give a corner away last
+OTHELLO_SQUARE_WEIGHTS = [
+    [20, 2, 8, 6, 6, 8, 2, 20],
+    [2, 1, 3, 3, 3, 3, 1, 2],
+    [8, 3, 5, 4, 4, 5, 3, 8],
+    [6, 3, 4, 4, 4, 4, 3, 6],
+    [6, 3, 4, 4, 4, 4, 3, 6],
+    [8, 3, 5, 4, 4, 5, 3, 8],
+    [2, 1, 3, 3, 3, 3, 1, 2],
+    [20, 2, 8, 6, 6, 8, 2, 20],
+]
+CONNECT4_COLUMN_WEIGHTS = [1, 2, 3, 4, 3, 2, 1]
+
+# MOVE_WEIGHTS[type(game)][move], built once. Games without an entry are sampled uniformly.
+MOVE_WEIGHTS = {
+    Othello: {(row, col): OTHELLO_SQUARE_WEIGHTS[row][col] for row in range(8) for col in range(8)},
+    BitboardOthello: {square(row, col): OTHELLO_SQUARE_WEIGHTS[row][col] for row in range(8) for col in range(8)},
+    Connect4: dict(enumerate(CONNECT4_COLUMN_WEIGHTS)),
+}
+
+CORNERS = (1 << square(0, 0)) | (1 << square(0, 7)) | (1 << square(7, 0)) | (1 << square(7, 7))
+CORNER_VALUE, MOBILITY_VALUE = 10, 2
+# Chick, giraffe, elephant, hen. A captured hen stays a hen in hand and counts as one there too.
+PIECE_VALUES = [0, 1, 5, 3, 6, 0]
+
+
+def othello_evaluation(game):
+    # Discs, corners and mobility from the side to move's point of view
+    if isinstance(game, Othello):
+        game = BitboardOthello.from_othello(game)
+    own, opponent = game.own_opponent()
+    replies = BitboardOthello(-game.player, game.black, game.white, 0).legal_mask()
+    return own.bit_count() - opponent.bit_count() + \
+        CORNER_VALUE * ((own & CORNERS).bit_count() - (opponent & CORNERS).bit_count()) + \
+        MOBILITY_VALUE * (len(game.moves()) - replies.bit_count())
+
+
+def catch_the_lion_evaluation(game):
+    # Material on the board and in hand from the side to move's point of view
+    if isinstance(game, CatchTheLion):
+        game = EncodedCatchTheLion.from_catch_the_lion(game)
+    player = game.current_player
+    material = sum(PIECE_VALUES[abs(code)] * (1 if code * player > 0 else -1) for code in game.board if code != 0)
+    for piece in range(1, 5):
+        own = (game.hands >> hand_shift(player, piece)) & 7
+        opponent = (game.hands >> hand_shift(-player, piece)) & 7
+        material += PIECE_VALUES[piece] * (own - opponent)
+    return material
+
+
+EVALUATIONS = {
+    Othello: othello_evaluation,
+    BitboardOthello: othello_evaluation,
+    CatchTheLion: catch_the_lion_evaluation,
+    EncodedCatchTheLion: catch_the_lion_evaluation,
+}
+
+
+class RolloutPolicy:
+    # Plays one playout on the game's own state and unwinds it. Moves are drawn from MOVE_WEIGHTS when
+    # weighted is set, uniformly otherwise. With a cutoff, the playout stops after that many plies and the
+    # sign of the game's evaluation names the winner. Games without an evaluation are played to the end.
+
+    def __init__(self, weighted=True, cutoff=None):
+        self.weighted = weighted
+        self.cutoff = cutoff
+
+    def __repr__(self):
+        return f'RolloutPolicy(weighted={self.weighted}, cutoff={self.cutoff})'
+
+    def __call__(self, game):
+        weights = MOVE_WEIGHTS.get(type(game)) if self.weighted else None
+        evaluate = EVALUATIONS.get(type(game)) if self.cutoff is not None else None
+        plies = self.cutoff if evaluate is not None else -1
+        tokens = []
+        while plies != 0 and len(moves := game.moves()) > 0:
+            if weights is None:
+                move = random.choice(moves)
+            else:
+                move = random.choices(moves, [weights[move] for move in moves])[0]
+            tokens.append(game.play(move))
+            plies -= 1
+
+        if plies == 0 and len(game.moves()) > 0:
+            # A level position goes to either side, a draw would count for both in backpropagation
+            value = evaluate(game) or random.choice((1, -1))
+            winner = game.player_name() if value > 0 else game.opposite_player()
+        else:
+            winner = game.winner()
+        for token in reversed(tokens):
+            game.undo(token)
+        return winner
+
+
+# Names usable as the rollout= argument of the searches and Player, None is the uniform playout to the end
+ROLLOUTS = {
+    'random': None,
+    'weighted': RolloutPolicy(),
+    'cutoff': RolloutPolicy(weighted=False, cutoff=10),
+    'weighted-cutoff': RolloutPolicy(cutoff=10),
+}
+
+
+def rollout_policy(rollout):
+    return ROLLOUTS[rollout] if isinstance(rollout, str) else rollout
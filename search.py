@@ -0,0 +1,165 @@
+from mcts import Node, new_root, SEARCHES
+import threading
+import asyncio
+import math
+import time
+
+
+def decided(root):
+    # The root is proven, one move is a proven win, or every move but one is a proven loss
+    if root.is_terminal:
+        return True
+    children = root.children
+    # A proven win among the expanded children decides it even while other moves are untried
+    if any(child.terminal_value == math.inf for child in children):
+        return True
+    if getattr(root, 'untried', None) or len(children) == 0:
+        return False
+    return sum(child.terminal_value != -math.inf for child in children) <= 1
+
+
+class Search:
+    # Runs one of the SEARCHES in a background thread on a copy of the game. The search ends at stop(),
+    # when its duration or iterations run out, or as soon as the root is decided. Without a duration it runs
+    # until stopped, which is how pondering on the opponent's time works:
+    #
+    #     ponder = Search(game_after_our_move).start()
+    #     ...opponent plays move...
+    #     search = Search(game, root=ponder.follow(move), duration=1).start()
+    #     move = await search  # or search.wait()
+
+    CHECK_EVERY = 64
+
+    def __init__(self, game, name='mcts', duration=math.inf, root=None, tree='node', **kwargs):
+        self.game = game.copy()
+        self.name = name
+        self.duration = duration
+        self.kwargs = kwargs
+        self.c = kwargs.get('c', 1.3)
+        self.root = root if root is not None else new_root(self.game, tree, kwargs.get('symmetric', False))
+        self.move = None
+        self.error = None
+        self.stopping = threading.Event()
+        self.thread = None
+        self.polls = 0
+
+    def should_stop(self):
+        self.polls += 1
+        return self.stopping.is_set() or (self.polls % Search.CHECK_EVERY == 0 and decided(self.root))
+
+    def run(self):
+        try:
+            self.move = SEARCHES[self.name](self.game, duration=self.duration, root=self.root,
+                                            stop=self.should_stop, **self.kwargs)
+        except Exception as error:
+            self.error = error
+
+    def start(self):
+        moves = self.game.moves()
+        if len(moves) == 1:
+            self.move = moves[0]  # forced, nothing to search
+        elif len(moves) > 0:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def best_move_so_far(self):
+        if self.move is not None:
+            return self.move
+        children = self.root.children
+        if len(children) == 0:
+            return None
+        return self.root.best_move(self.c)
+
+    def wait(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.move
+
+    def stop(self):
+        self.stopping.set()
+        return self.wait()
+
+    def __await__(self):
+        return asyncio.get_running_loop().run_in_executor(None, self.wait).__await__()
+
+    def follow(self, move):
+        # Stops the search and hands over the subtree of move as the root of the next one
+        self.stop()
+        for child in self.root.children:
+            if child.move == move and type(child) is Node:
+                child.parent = None
+                return child
+        return None
+
+
+class GameClock:
+    # Time budget for a whole game. start() gives each move a share of the time left and returns the hard
+    # limit for the search, stop() is its stop callback. The search ends before its share once the root is
+    # decided or the most visited move can't be caught at the current rate, and runs past it up to
+    # `extension` shares while the most visited move is not the one best_move() would play.
+
+    CHECK_EVERY = 64
+
+    def __init__(self, total, moves_to_go=20, extension=2, reserve=0.05, minimum=0.01):
+        self.total = total
+        self.moves_to_go = moves_to_go
+        self.extension = extension
+        self.reserve = reserve
+        self.minimum = minimum
+        self.remaining = total
+        self.root = None
+        self.c = 1.3
+        self.started = self.share = 0
+        self.start_visits = 0
+        self.polls = 0
+
+    def new_game(self):
+        self.remaining = self.total
+
+    def moves_left(self, game):
+        # Own moves still to play: half the empty squares where the game has them, else a fixed horizon
+        if hasattr(game, 'empties'):
+            return max(1, min(self.moves_to_go, (game.empties() + 1) // 2))
+        return self.moves_to_go
+
+    def start(self, game, root, c):
+        self.root, self.c = root, c
+        self.started = time.time()
+        self.polls = 0
+        # A reused root arrives with visits of earlier searches, the rate only counts this one's
+        self.start_visits = root.visits if root is not None else 0
+        # Every move gets at least `minimum` seconds, even once the clock has run out
+        self.share = max(self.remaining / self.moves_left(game), self.minimum)
+        return max(min(self.share * self.extension, self.remaining * (1 - self.reserve)), self.minimum)
+
+    def finish(self):
+        # Overruns are charged too, remaining goes negative when the game took longer than its budget
+        self.remaining -= time.time() - self.started
+
+    def stop(self):
+        self.polls += 1
+        if self.polls % GameClock.CHECK_EVERY != 0:
+            return False
+        root = self.root
+        if decided(root):
+            return True
+        if getattr(root, 'untried', None):
+            return False
+        children = root.children
+        if len(children) < 2:
+            return False
+        elapsed = time.time() - self.started
+        ranked = sorted(range(len(children)), key=lambda k: children[k].visits, reverse=True)
+        if elapsed < self.share:
+            # The runner-up gets at most every remaining iteration of the share
+            rate = (root.visits - self.start_visits) / elapsed
+            return children[ranked[0]].visits - children[ranked[1]].visits > rate * (self.share - elapsed)
+        # A DAG root keeps its own moves to shared children in child_moves
+        moves = getattr(root, 'child_moves', None) or [child.move for child in children]
+        return moves[ranked[0]] == root.best_move(self.c)
@@ -0,0 +1,127 @@
+from minimax import TranspositionTable, EXACT, LOWER, UPPER
+from othello import Othello, BitboardOthello, FULL, row_col
+from connect4 import Connect4
+
+# Values are game-theoretic outcomes for the side to move
+WIN, DRAW, LOSS = 1, 0, -1
+
+# The four 4x4 quadrants of the Othello board, for parity ordering
+QUADRANTS = [sum(1 << (row * 8 + col) for row in rows for col in cols)
+             for rows in (range(4), range(4, 8)) for cols in (range(4), range(4, 8))]
+CENTER_FIRST = [3, 2, 4, 1, 5, 0, 6]
+
+
+def outcome(game):
+    winner = game.winner()
+    if winner is None:
+        return DRAW
+    return WIN if winner == game.player_name() else LOSS
+
+
+class Solver:
+    # Exact win/draw/loss solver for positions with at most `empties` empty squares: negamax with principal
+    # variation search, a transposition table and ordering by the table move, Othello quadrant parity and
+    # opponent mobility (fewest replies first) or Connect4 center columns. Games without empties() are
+    # never solved. Table bounds are game-theoretic, not depth-limited, so one solver can be kept for a
+    # whole game.
+
+    def __init__(self, empties=10, table_size=2**18, mobility_empties=7):
+        self.empties = empties
+        self.mobility_empties = mobility_empties
+        self.table = TranspositionTable(table_size)
+        self.nodes = 0
+
+    def applies(self, game):
+        return hasattr(game, 'empties') and game.empties() <= self.empties
+
+    def solve(self, game):
+        # Returns the value for the side to move and a move reaching it
+        board = BitboardOthello.from_othello(game) if isinstance(game, Othello) else game.copy()
+        moves = board.moves()
+        if len(moves) == 0:
+            return outcome(board), None
+        # The root move is searched here rather than read back from the table, where a deeper entry of an
+        # earlier, larger solve can hold the slot
+        entry = self.table.lookup(board.zobrist)
+        best, best_move = LOSS - 1, None
+        for move in self.ordered_moves(board, moves, entry[4] if entry is not None else None):
+            token = board.play(move)
+            value = -self.negamax(board, -WIN, -max(best, LOSS))
+            board.undo(token)
+            if value > best:
+                best, best_move = value, move
+                if best == WIN:
+                    break
+        self.table.store(board.zobrist, board.empties(), best, EXACT, best_move)
+        if isinstance(game, Othello):
+            best_move = row_col(best_move)
+        return best, best_move
+
+    def ordered_moves(self, game, moves, best_move):
+        if isinstance(game, BitboardOthello):
+            empty = FULL & ~(game.black | game.white)
+            odd = 0
+            for quadrant in QUADRANTS:
+                if (empty & quadrant).bit_count() % 2 == 1:
+                    odd |= quadrant
+            mobility = game.empties() > self.mobility_empties
+
+            def score(move):
+                replies = 0
+                if mobility:
+                    token = game.play(move)
+                    replies = len(game.moves())
+                    game.undo(token)
+                return move != best_move, not (odd >> move & 1), replies
+            return sorted(moves, key=score)
+        if isinstance(game, Connect4):
+            return sorted(moves, key=lambda move: (move != best_move, CENTER_FIRST.index(move)))
+        if best_move is None:
+            return moves
+        return [best_move] + [move for move in moves if move != best_move]
+
+    def negamax(self, game, alpha, beta):
+        self.nodes += 1
+        moves = game.moves()
+        if len(moves) == 0:
+            return outcome(game)
+
+        best_move = None
+        entry = self.table.lookup(game.zobrist)
+        if entry is not None:
+            _, _, value, bound, best_move = entry
+            if bound == EXACT:
+                return value
+            if bound == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+        original_alpha = alpha
+
+        best = LOSS - 1
+        for k, move in enumerate(self.ordered_moves(game, moves, best_move)):
+            token = game.play(move)
+            if k == 0:
+                value = -self.negamax(game, -beta, -alpha)
+            else:
+                # Null window first, searched again only when the move might beat the first one
+                value = -self.negamax(game, -alpha - 1, -alpha)
+                if alpha < value < beta:
+                    value = -self.negamax(game, -beta, -value)
+            game.undo(token)
+            if value > best:
+                best, best_move = value, move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+        if best <= original_alpha:
+            bound = UPPER
+        elif best >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(game.zobrist, game.empties(), best, bound, best_move)
+        return best
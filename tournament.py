@@ -0,0 +1,223 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from utils import sprt
+import multiprocessing
+import random
+import json
+import time
+import zlib
+import os
+
+
+# Rough plies per game, only used to order the jobs so the longest ones start first
+EXPECTED_PLIES = {'Othello': 60, 'CatchTheLion': 40, 'EncodedCatchTheLion': 40, 'Connect4': 30}
+
+
+class Experiment:
+
+    def __init__(self, name, game, player1, player2, games=100):
+        self.name = name
+        self.game = game
+        self.player1 = player1
+        self.player2 = player2
+        self.games = games
+
+    def expected_seconds(self):
+        plies = EXPECTED_PLIES.get(self.game.__name__, 60)
+        return sum(expected_seconds(player, plies) for player in (self.player1, self.player2))
+
+
+def expected_seconds(player, plies):
+    # Search time one player is expected to spend on a game of that many plies
+    if player.name == 'random':
+        return 0
+    if player.clock is not None:
+        return player.clock.total
+    return player.kwargs.get('duration', 1) * plies / 2
+
+
+def game_seed(seed, experiment, index):
+    # Stable across runs and processes, so a resumed tournament replays the same games
+    return zlib.crc32(f'{seed}/{experiment}/{index}'.encode())
+
+
+def json_default(value):
+    # numpy scalars in moves or parameters
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def play_game(experiment, index, seed):
+    random.seed(seed)
+    players = [experiment.player1, experiment.player2]
+    order = [0, 1]
+    random.shuffle(order)
+
+    for player in players:
+        player.new_game()
+    game = experiment.game()
+    moves, times = [], []
+    start = time.time()
+    while len(game.moves()) > 0:
+        player = players[order[len(moves) % 2]]
+        move_start = time.perf_counter()
+        move = player.model(game)
+        times.append(time.perf_counter() - move_start)
+        game.play(move)
+        moves.append(move)
+
+    # result is from player1's side: 1 win, -1 loss, 0 draw
+    slot = {'X': order[0], 'O': order[1]}.get(game.winner())
+    winner = 'Draw' if slot is None else players[slot].label
+    result = 0 if slot is None else 1 - 2 * slot
+    return dict(experiment=experiment.name, index=index, seed=seed, game=experiment.game.__name__,
+                players=[players[0].describe(), players[1].describe()], first=order[0],
+                moves=moves, times=times, winner=winner, result=result, seconds=time.time() - start)
+
+
+def read_records(path):
+    records = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # a line cut short by an interruption, that game is played again
+    return records
+
+
+def pending_jobs(experiments, records):
+    done = {(record['experiment'], record['index']) for record in records}
+    jobs = [(experiment, index) for experiment in experiments for index in range(experiment.games)
+            if (experiment.name, index) not in done]
+    # Longest expected games first, so the short ones fill in the gaps at the end of the run
+    return sorted(jobs, key=lambda job: job[0].expected_seconds(), reverse=True)
+
+
+def record_result(record):
+    if 'result' in record:
+        return record['result']
+    if record['winner'] == 'Draw':
+        return 0
+    first = record['players'][0]
+    return 1 if record['winner'] == first.get('label', first['name']) else -1
+
+
+def scores(results):
+    return results.count(1), results.count(-1), results.count(0)
+
+
+def run_tournament(experiments, path, workers=None, seed=0, adaptive=False, max_games_factor=2, **sprt_args):
+    if adaptive:
+        return run_adaptive(experiments, path, workers, seed, max_games_factor, **sprt_args)
+    jobs = pending_jobs(experiments, read_records(path))
+    print(f'{len(jobs)} games to play\n')
+    with ProcessPoolExecutor(max_workers=workers or multiprocessing.cpu_count()) as executor, \
+            open_results(path) as f:
+        futures = [executor.submit(play_game, experiment, index, game_seed(seed, experiment.name, index))
+                   for experiment, index in jobs]
+        for future in as_completed(futures):
+            # One line per finished game, flushed right away so an interruption loses only running games
+            f.write(json.dumps(future.result(), default=json_default) + '\n')
+            f.flush()
+    return summarize(path)
+
+
+def open_results(path):
+    f = open(path, 'a+')
+    # Terminate a line cut short by an interruption so the next record starts on its own line
+    if f.tell() > 0:
+        f.seek(f.tell() - 1)
+        if f.read(1) != '\n':
+            f.write('\n')
+    return f
+
+
+def run_adaptive(experiments, path, workers=None, seed=0, max_games_factor=2, **sprt_args):
+    # Pairings stop once sprt() decides. The games they leave over the total of experiment.games stay in the
+    # budget, and go to the undecided pairings, up to max_games_factor times their own games each.
+    workers = workers or multiprocessing.cpu_count()
+    results = {experiment.name: [] for experiment in experiments}
+    next_index = dict.fromkeys(results, 0)
+    for record in read_records(path):
+        if record['experiment'] in results:
+            results[record['experiment']].append(record_result(record))
+            next_index[record['experiment']] = max(next_index[record['experiment']], record['index'] + 1)
+    budget = sum(experiment.games for experiment in experiments) - sum(map(len, results.values()))
+    running = dict.fromkeys(results, 0)
+
+    def undecided(experiment):
+        played = len(results[experiment.name]) + running[experiment.name]
+        return played < experiment.games * max_games_factor and \
+            sprt(*scores(results[experiment.name]), **sprt_args) == 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, open_results(path) as f:
+        futures = dict()
+        while True:
+            while budget > 0 and len(futures) < workers:
+                candidates = [experiment for experiment in experiments if undecided(experiment)]
+                if len(candidates) == 0:
+                    break
+                # The pairing with the fewest games goes next, the longest first among equals
+                experiment = min(candidates, key=lambda e: (len(results[e.name]) + running[e.name],
+                                                           -e.expected_seconds()))
+                index = next_index[experiment.name]
+                next_index[experiment.name] += 1
+                running[experiment.name] += 1
+                budget -= 1
+                future = executor.submit(play_game, experiment, index, game_seed(seed, experiment.name, index))
+                futures[future] = experiment
+            if len(futures) == 0:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                experiment = futures.pop(future)
+                record = future.result()
+                running[experiment.name] -= 1
+                results[experiment.name].append(record['result'])
+                f.write(json.dumps(record, default=json_default) + '\n')
+                f.flush()
+    return summarize(path)
+
+
+def savings(path, experiments=None, **sprt_args):
+    # Replays recorded games in index order and reports where sprt() would have stopped each pairing
+    results = dict()
+    for record in sorted(read_records(path), key=lambda record: record['index']):
+        results.setdefault(record['experiment'], []).append(record_result(record))
+    report = dict()
+    for name, outcomes in results.items():
+        if experiments is not None and name not in experiments:
+            continue
+        stop, decision = len(outcomes), 0
+        for n in range(1, len(outcomes) + 1):
+            if (decision := sprt(*scores(outcomes[:n]), **sprt_args)) != 0:
+                stop = n
+                break
+        report[name] = dict(played=len(outcomes), needed=stop, saved=len(outcomes) - stop, decision=decision)
+    return report
+
+
+def search_seconds(record):
+    # Search time of player1 and player2 in one recorded game
+    seconds = [0, 0]
+    for ply, move_seconds in enumerate(record['times']):
+        seconds[(record['first'] + ply) % 2] += move_seconds
+    return seconds
+
+
+def time_report(path, experiments=None):
+    # Mean search seconds per game of both players, by experiment
+    totals = dict()
+    for record in read_records(path):
+        if experiments is None or record['experiment'] in experiments:
+            totals.setdefault(record['experiment'], []).append(search_seconds(record))
+    return {name: [sum(seconds) / len(games) for seconds in zip(*games)] for name, games in totals.items()}
+
+
+def summarize(path):
+    results = dict()
+    for record in read_records(path):
+        winners = results.setdefault(record['experiment'], dict())
+        winners[record['winner']] = winners.get(record['winner'], 0) + 1
+    return results
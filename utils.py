@@ -1,29 +1,111 @@
+from minimax import iterative_deepening, ProofCache
+from parallel import parallel_search
 from mcts import *
+from solver import Solver
+from book import OpeningBook
+from search import GameClock
 
 
 class Player:
 
-    def __init__(self, name, *args, **kwargs):
+    def __init__(self, name, *args, reuse_tree=True, max_tree_nodes=None, proof_cache=2**16, solver_empties=None,
+                 book=None, clock=None, label=None, **kwargs):
         self.name = name
+        # Name in results and stats, to tell apart two players of the same search
+        self.label = label or name
         self.args = args
         self.kwargs = kwargs
+        self.reuse_tree = reuse_tree
+        self.max_tree_nodes = max_tree_nodes
+        self.root = None
+        self.move = None
+        self.stats = None
+        self.table = None
+        # Minimax results of the hybrids, kept across iterations and turns
+        self.proofs = ProofCache(proof_cache, kwargs.get('symmetric', False)) if proof_cache else None
+        # Exact endgame solving below this many empty squares, for the games that have empties()
+        self.solver = Solver(solver_empties) if solver_empties is not None else None
+        # Path of an opening book file, probed before any search
+        self.book = OpeningBook(book) if book is not None else None
+        # Seconds for a whole game, in place of a fixed duration per move
+        self.clock = GameClock(clock) if clock is not None else None
+
+    def describe(self):
+        return dict(name=self.name, label=self.label, args=list(self.args), kwargs=self.kwargs,
+                    reuse_tree=self.reuse_tree, max_tree_nodes=self.max_tree_nodes,
+                    proof_cache=self.proofs and self.proofs.size, solver_empties=self.solver and self.solver.empties,
+                    book=self.book and self.book.path, clock=self.clock and self.clock.total)
+
+    def new_game(self):
+        self.root = self.move = None
+        if self.clock is not None:
+            self.clock.new_game()
+
+    def reuse(self, game):
+        # After our move and the opponent's reply the new position is a grandchild of the last root
+        if self.reuse_tree and type(self.root) is Node:
+            key = game.key()
+            for child in self.root.children:
+                if child.move == self.move:
+                    for grandchild in child.children:
+                        if grandchild.game.key() == key:
+                            grandchild.parent = None
+                            if self.max_tree_nodes is not None:
+                                grandchild.prune(self.max_tree_nodes)
+                            return grandchild
+        return new_root(game, self.kwargs.get('tree', 'node'), self.kwargs.get('symmetric', False))
 
     def model(self, game):
         if self.name == 'random':
             return random.choice(game.moves())
-        elif self.name == 'mcts':
-            return mcts(game, *self.args, **self.kwargs)
-        elif self.name == 'mcts-mr':
-            return mcts_mr(game, *self.args, **self.kwargs)
-        elif self.name == 'mcts-ms':
-            return mcts_ms(game, *self.args, **self.kwargs)
-        elif self.name == 'mcts-mb':
-            return mcts_mb(game, *self.args, **self.kwargs)
+        elif self.book is not None and (move := self.book.probe(game)) is not None:
+            self.root = None  # nothing to reuse after a book move
+            return move
+        elif self.clock is not None and len(game.moves()) == 1:
+            self.root = None
+            return game.moves()[0]  # forced, no time spent
+        elif self.name == 'minimax':
+            # The transposition table is kept from move to move, it seeds the next search's move ordering
+            if self.table is None:
+                self.table = TranspositionTable(symmetric=self.kwargs.get('symmetric', False))
+            kwargs = self.kwargs
+            if 'duration' not in kwargs and 'max_nodes' not in kwargs:
+                kwargs = dict(kwargs, duration=1)  # the default budget of the other players
+            if self.clock is not None:
+                # Iterative deepening has no stop callback to end early or extend, it searches for the share
+                self.clock.start(game, None, None)
+                kwargs = dict(kwargs, duration=self.clock.share)
+            move = iterative_deepening(game, *self.args, table=self.table, **kwargs)[1]
+            self.clock and self.clock.finish()
+            return move
+        elif self.kwargs.get('workers', 1) > 1:
+            kwargs = self.kwargs
+            if self.clock is not None:
+                # The stop callback can't reach the workers, they search for the move's share
+                self.clock.start(game, None, kwargs.get('c', 1.3))
+                kwargs = dict(kwargs, duration=self.clock.share)
+            move = parallel_search(self.name, game, *self.args, stats=self.stats, proofs=self.proofs,
+                                   solver=self.solver, **kwargs)
+            self.clock and self.clock.finish()
+            return move
+        elif self.name in SEARCHES:
+            root = self.reuse(game)
+            kwargs = self.kwargs
+            if self.clock is not None:
+                kwargs = dict(kwargs, duration=self.clock.start(game, root, kwargs.get('c', 1.3)),
+                              stop=self.clock.stop)
+            self.move = SEARCHES[self.name](game, *self.args, root=root, stats=self.stats, proofs=self.proofs,
+                                            solver=self.solver, **kwargs)
+            self.clock and self.clock.finish()
+            self.root = root
+            return self.move
         else:
             raise Exception(f"No implementation for player {self.name}")
 
 
 def simulate_game(game, player1, player2):
+    player1.new_game()
+    player2.new_game()
     while len(game.moves()) > 0:
         move = player1.model(game)
         game.play(move)
@@ -33,13 +115,34 @@ def simulate_game(game, player1, player2):
 
     winner = game.winner()
     if winner == 'X':
-        return player1.name
+        return player1.label
     if winner == 'O':
-        return player2.name
+        return player2.label
     return 'Draw'
 
 
-def simulate_series(game_creator, number_of_games, model1, model2):
+def sprt(wins, losses, draws, elo=50, alpha=0.05, beta=0.05):
+    # Sequential probability ratio test of "+elo" against "-elo" for the first player, using the normal
+    # approximation of the score. One virtual win and loss keep a short unbeaten run from deciding alone.
+    # Returns 1 once the first player is shown stronger, -1 once shown weaker and 0 while undecided.
+    wins, losses = wins + 1, losses + 1
+    n = wins + losses + draws
+    score = (wins + draws / 2) / n
+    variance = (wins * (1 - score) ** 2 + losses * score ** 2 + draws * (1 / 2 - score) ** 2) / n
+    score0, score1 = (1 / (1 + 10 ** (e / 400)) for e in (elo, -elo))
+    llr = n * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+    if llr >= math.log((1 - beta) / alpha):
+        return 1
+    if llr <= math.log(beta / (1 - alpha)):
+        return -1
+    return 0
+
+
+def simulate_series(game_creator, number_of_games, model1, model2, stats=None, adaptive=False, **sprt_args):
+    # When a stats dict is given, each player's search statistics are summed into stats[player.label].
+    # Adaptive series stop as soon as sprt() decides, number_of_games is then only the upper bound.
+    if adaptive and model1.label == model2.label:
+        raise Exception("Adaptive series need players with distinct labels")
     winners = dict()
     players = [model1, model2]
     for _ in range(number_of_games):
@@ -47,7 +150,31 @@ def simulate_series(game_creator, number_of_games, model1, model2):
         first_player = players[0]
         second_player = players[1]
 
+        if stats is not None:
+            for player in players:
+                player.stats = SearchStats()
         winner = simulate_game(game_creator(), first_player, second_player)
         winners[winner] = winners.get(winner, 0) + 1
+        if stats is not None:
+            for player in players:
+                stats.setdefault(player.label, SearchStats()).merge(player.stats)
+                player.stats = None
+        if adaptive and sprt(winners.get(model1.label, 0), winners.get(model2.label, 0), winners.get('Draw', 0),
+                             **sprt_args) != 0:
+            break
 
     return winners
+
+
+def perft(game, depth):
+    if depth == 0:
+        return 1
+    moves = game.moves()
+    if depth == 1:
+        return len(moves)
+    total = 0
+    for move in moves:
+        child = game.copy()
+        child.play(move)
+        total += perft(child, depth - 1)
+    return total
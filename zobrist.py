@@ -0,0 +1,25 @@
+import random
+
+
+# Fixed seed so hashes are identical across processes and runs
+rng = random.Random(20240101)
+
+
+def table(*shape):
+    if len(shape) == 1:
+        return [rng.getrandbits(64) for _ in range(shape[0])]
+    return [table(*shape[1:]) for _ in range(shape[0])]
+
+
+SIDE = rng.getrandbits(64)
+
+
+class Unknown:
+    # Marker of a game's memo slot not computed yet, shared by the games. Pickles by name, so a game sent to a
+    # worker process still compares its slots `is UNKNOWN` there.
+    def __reduce__(self):
+        return 'UNKNOWN'
+
+
+UNKNOWN = Unknown()
+